@@ -0,0 +1,121 @@
+"""
+Times the database lookups made on the /callback path against a seeded
+SQLite database, first with the lookup indexes and then without them.
+
+    $ python benchmarks/callback_queries.py --groups 5000 --members 25
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GROUPME_TOKEN', 'benchmark')
+os.environ.setdefault('REDISTOGO_URL', 'redis://localhost:6379/0')
+
+from src import app, db  # noqa: E402
+from src.models import Command, Group, Member, Reminder  # noqa: E402
+
+INDEXES = [
+    'uq_members_group_user',
+    'ix_members_group_mod',
+    'ix_members_group_ignored',
+    'uq_commands_group_command',
+    'ix_reminders_group_id',
+    'ix_reminders_remind_time',
+]
+
+
+def seed(groups, members, commands, reminders):
+    now = datetime.now()
+    group_rows, member_rows, command_rows, reminder_rows = [], [], [], []
+
+    for g in range(groups):
+        group_id = str(10000000 + g)
+        group_rows.append({'group_id': group_id, 'group_name': f'group {g}',
+                           'message_count': 0, 'like_count': 0, 'member_count': members,
+                           'ml_message': 'None', 'ml_likes': 0,
+                           'date_created': now, 'last_updated': now})
+        for m in range(members):
+            member_rows.append({'group_id': group_id, 'user_id': str(20000000 + m),
+                                'username': f'member {m}', 'avatar_url': '',
+                                'message_count': 0, 'like_count': 0, 'likes_given': 0,
+                                'is_mod': m == 0, 'is_ignored': m == 1})
+        for c in range(commands):
+            command_rows.append({'group_id': group_id, 'command': f'command{c}',
+                                 'response': 'response', 'description': '',
+                                 'times_used': 0})
+        for r in range(reminders):
+            reminder_rows.append({'group_id': group_id, 'user_id': str(20000000 + r),
+                                  'message': 'reminder',
+                                  'remind_time': now + timedelta(minutes=random.randint(-5, 600))})
+
+    db.session.bulk_insert_mappings(Group, group_rows)
+    db.session.bulk_insert_mappings(Member, member_rows)
+    db.session.bulk_insert_mappings(Command, command_rows)
+    db.session.bulk_insert_mappings(Reminder, reminder_rows)
+    db.session.commit()
+
+
+def time_lookups(groups, members, iterations):
+    lookups = [
+        ('Group.get_group', lambda g, u: Group.get_group(g)),
+        ('Member.get_member', lambda g, u: Member.get_member(g, user_id=u)),
+        ('Member.get_mods', lambda g, u: Member.get_mods(g)),
+        ('Member.get_ignored', lambda g, u: Member.get_ignored(g)),
+        ('Command.get_commands', lambda g, u: Command.get_commands(g)),
+        ('Command.get_command', lambda g, u: Command.get_command(g, 'command1')),
+        ('Reminder.get_due', lambda g, u: Reminder.get_due(datetime.now())),
+    ]
+    timings = {name: 0 for name, _ in lookups}
+
+    for _ in range(iterations):
+        group_id = str(10000000 + random.randrange(groups))
+        user_id = str(20000000 + random.randrange(members))
+        for name, lookup in lookups:
+            started = time.perf_counter()
+            lookup(group_id, user_id)
+            timings[name] += time.perf_counter() - started
+        db.session.expunge_all()
+
+    return {name: total / iterations * 1000 for name, total in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--groups', type=int, default=5000)
+    parser.add_argument('--members', type=int, default=25)
+    parser.add_argument('--commands', type=int, default=10)
+    parser.add_argument('--reminders', type=int, default=2)
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False).name
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_file
+
+    try:
+        db.create_all()
+        seed(args.groups, args.members, args.commands, args.reminders)
+
+        indexed = time_lookups(args.groups, args.members, args.iterations)
+        for index in INDEXES:
+            db.session.execute(f'DROP INDEX {index}')
+        db.session.commit()
+        unindexed = time_lookups(args.groups, args.members, args.iterations)
+    finally:
+        os.remove(db_file)
+
+    print(f'{args.groups} groups x {args.members} members, '
+          f'{args.iterations} iterations (mean ms per lookup)\n')
+    print(f'{"lookup":<24}{"no index":>12}{"indexed":>12}')
+    for name in indexed:
+        print(f'{name:<24}{unindexed[name]:>12.3f}{indexed[name]:>12.3f}')
+    print(f'{"callback total":<24}{sum(unindexed.values()):>12.3f}'
+          f'{sum(indexed.values()):>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
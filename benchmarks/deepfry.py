@@ -0,0 +1,71 @@
+"""
+Compares the NumPy deep-fry filter in src/images.py against the original
+chain of PIL passes over several image sizes.
+
+    $ python benchmarks/deepfry.py --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageOps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GROUPME_TOKEN', 'benchmark')
+os.environ.setdefault('REDISTOGO_URL', 'redis://localhost:6379/0')
+
+from src import images  # noqa: E402
+
+SIZES = [(320, 240), (800, 600), (1280, 960), (1920, 1080), (2048, 2048)]
+
+
+def pil_deepfry(img):
+    """The filter chain !jpeg used before the NumPy engine"""
+    width, height = img.width, img.height
+    img = img.resize((int(width ** .75), int(height ** .75)), resample=Image.LANCZOS)
+    img = img.resize((int(width ** .88), int(height ** .88)), resample=Image.BILINEAR)
+    img = img.resize((int(width ** .9), int(height ** .9)), resample=Image.BICUBIC)
+    img = img.resize((width, height), resample=Image.BICUBIC)
+    img = ImageOps.posterize(img, 4)
+
+    r = img.split()[0]
+    r = ImageEnhance.Contrast(r).enhance(2.0)
+    r = ImageEnhance.Brightness(r).enhance(1.5)
+    r = ImageOps.colorize(r, (254, 0, 2), (255, 255, 15))
+
+    img = Image.blend(img, r, 0.75)
+    return ImageEnhance.Sharpness(img).enhance(100.0)
+
+
+def best_of(func, img, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        result = func(img)
+        timings.append(time.process_time() - started)
+    return min(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    print(f'{"size":<12}{"PIL ms":>10}{"NumPy ms":>10}{"speedup":>10}{"max diff":>10}')
+    for width, height in SIZES:
+        noise = rng.randint(0, 256, (height // 4, width // 4, 3)).astype(np.uint8)
+        img = Image.fromarray(noise, 'RGB').resize((width, height), Image.BICUBIC)
+
+        pil_ms, expected = best_of(pil_deepfry, img, args.repeat)
+        numpy_ms, actual = best_of(images.deepfry, img, args.repeat)
+        diff = np.abs(np.asarray(expected, dtype=np.int16) - np.asarray(actual, dtype=np.int16))
+
+        print(f'{f"{width}x{height}":<12}{pil_ms:>10.1f}{numpy_ms:>10.1f}'
+              f'{pil_ms / numpy_ms:>9.2f}x{diff.max():>10}')
+
+
+if __name__ == '__main__':
+    main()
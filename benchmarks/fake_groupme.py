@@ -0,0 +1,281 @@
+"""
+A local stand-in for the GroupMe API serving synthetic groups: groups,
+members, messages, the gallery, bots/post and the image service. Messages
+are generated from their position in the group rather than stored, so a
+group of millions of messages costs no memory.
+
+    $ python benchmarks/fake_groupme.py --groups 3 --messages 1000000 --latency 50
+
+Point GMBot at it with GROUPME_API_URL=<url>/v3/ and GROUPME_IMAGE_URL=<url>/
+"""
+import argparse
+import io
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import Flask, abort, jsonify, request
+from werkzeug.serving import make_server
+
+ME_ID = '10000000'
+MAX_PAGE = 100
+
+
+class SyntheticGroup:
+    """
+    A group whose message at position `i` (0 is the oldest) is derived from
+    `i` alone. Every `image_every`th message carries an image and shows up
+    in the gallery.
+    """
+
+    def __init__(self, index, members, messages, spacing=60, image_every=10):
+        self.index = index
+        self.group_id = str(20000000 + index)
+        self.bot_id = f'bot{self.group_id}'
+        self.id_base = (index + 1) * 10 ** 12
+        self.count = messages
+        self.spacing = spacing
+        self.image_every = image_every
+        self.start = int(time.time()) - messages * spacing
+        self.members = [{
+            'id': str(40000000 + index * 1000 + m),
+            'user_id': ME_ID if m == 0 else str(30000000 + m),
+            'nickname': f'Member {m}',
+            'image_url': f'https://i.groupme.com/avatar{m}',
+            'muted': False,
+            'autokicked': False,
+        } for m in range(members)]
+
+    def add_messages(self, count):
+        """Appends `count` new messages to the end of the group"""
+        self.count += count
+
+    def created_at(self, position):
+        return self.start + position * self.spacing
+
+    def position(self, message_id):
+        return int(message_id) - self.id_base
+
+    def message(self, position, base_url):
+        h = (position * 2654435761) & 0xffffffff
+        sender = self.members[h % len(self.members)]
+        likers = [self.members[(h + 1 + k * 3) % len(self.members)]['user_id']
+                  for k in range((h >> 8) % 4)]
+        message_id = str(self.id_base + position)
+
+        attachments = []
+        if position % self.image_every == 0:
+            attachments.append({'type': 'image', 'url': f'{base_url}/images/{message_id}.jpeg'})
+
+        return {
+            'id': message_id,
+            'source_guid': message_id,
+            'created_at': self.created_at(position),
+            'user_id': sender['user_id'],
+            'sender_id': sender['user_id'],
+            'sender_type': 'user',
+            'group_id': self.group_id,
+            'name': sender['nickname'],
+            'avatar_url': sender['image_url'],
+            'text': f'message {position} from {sender["nickname"]}',
+            'system': False,
+            'favorited_by': list(dict.fromkeys(likers)),
+            'attachments': attachments,
+        }
+
+    def data(self, base_url):
+        latest = self.message(self.count - 1, base_url) if self.count else None
+        return {
+            'id': self.group_id,
+            'group_id': self.group_id,
+            'name': f'Benchmark group {self.index}',
+            'type': 'private',
+            'description': '',
+            'image_url': None,
+            'creator_user_id': ME_ID,
+            'created_at': self.start - 1,
+            'updated_at': self.created_at(self.count - 1),
+            'office_mode': False,
+            'share_url': None,
+            'members': self.members,
+            'messages': {
+                'count': self.count,
+                'last_message_id': latest['id'] if latest else None,
+                'last_message_created_at': latest['created_at'] if latest else None,
+                'preview': {},
+            },
+        }
+
+
+class FakeGroupMe:
+    """
+    Serves a set of synthetic groups over HTTP on a background thread.
+    Every request sleeps `latency` seconds first and is counted by route in
+    `calls`.
+    """
+
+    def __init__(self, groups=1, members=25, messages=10000, latency=0.0,
+                 callback_url='http://localhost/callback'):
+        self.groups = {}
+        for index in range(groups):
+            group = SyntheticGroup(index, members, messages)
+            self.groups[group.group_id] = group
+        self.latency = latency
+        self.callback_url = callback_url
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self._image = None
+        self.app = self._build_app()
+
+    @property
+    def url(self):
+        return f'http://{self._server.host}:{self._server.port}'
+
+    def start(self, port=0):
+        self._server = make_server('127.0.0.1', port, self.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, name='fake-groupme',
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def snapshot(self):
+        """Returns a copy of the call counters"""
+        with self._lock:
+            return Counter(self.calls)
+
+    def _group(self, group_id):
+        group = self.groups.get(group_id)
+        if group is None:
+            abort(404)
+        return group
+
+    def _sample_image(self):
+        if self._image is None:
+            from PIL import Image
+
+            img = Image.effect_mandelbrot((1024, 768), (-2, -1.25, 1, 1.25), 64)
+            img = Image.merge('RGB', (img, img.rotate(180), img.transpose(Image.FLIP_LEFT_RIGHT)))
+            out = io.BytesIO()
+            img.save(out, 'JPEG', quality=85)
+            self._image = out.getvalue()
+        return self._image
+
+    def _build_app(self):
+        app = Flask(__name__)
+
+        @app.before_request
+        def count_and_delay():
+            if self.latency:
+                time.sleep(self.latency)
+            rule = request.url_rule.rule if request.url_rule else request.path
+            with self._lock:
+                self.calls[f'{request.method} {rule}'] += 1
+
+        @app.route('/v3/users/me')
+        def me():
+            return jsonify(response={'id': ME_ID, 'user_id': ME_ID, 'name': 'Member 0',
+                                     'image_url': None, 'email': None})
+
+        @app.route('/v3/bots')
+        def list_bots():
+            return jsonify(response=[{
+                'bot_id': group.bot_id,
+                'group_id': group.group_id,
+                'name': 'GMBot',
+                'avatar_url': None,
+                'callback_url': self.callback_url,
+                'dm_notification': False,
+            } for group in self.groups.values()])
+
+        @app.route('/v3/bots/post', methods=['POST'])
+        def post_message():
+            return '', 202
+
+        @app.route('/v3/groups/<group_id>')
+        def get_group(group_id):
+            group = self._group(group_id)
+            return jsonify(response=group.data(self.url))
+
+        @app.route('/v3/groups/<group_id>/messages')
+        def list_messages(group_id):
+            group = self._group(group_id)
+            limit = min(int(request.args.get('limit', 20)), MAX_PAGE)
+
+            if 'before_id' in request.args:
+                end = group.position(request.args['before_id'])
+                positions = range(end - 1, max(end - limit, 0) - 1, -1)
+            elif 'after_id' in request.args:
+                start = group.position(request.args['after_id']) + 1
+                positions = range(start, min(start + limit, group.count))
+            elif 'since_id' in request.args:
+                start = group.position(request.args['since_id']) + 1
+                positions = range(group.count - 1, max(group.count - limit, start) - 1, -1)
+            else:
+                positions = range(group.count - 1, max(group.count - limit, 0) - 1, -1)
+
+            if not positions:
+                return '', 304
+            messages = [group.message(p, self.url) for p in positions]
+            return jsonify(response={'count': group.count, 'messages': messages})
+
+        @app.route('/v3/conversations/<group_id>/gallery')
+        def gallery(group_id):
+            group = self._group(group_id)
+            limit = min(int(request.args.get('limit', 100)), MAX_PAGE)
+
+            end = group.count
+            if 'before' in request.args:
+                before = datetime.strptime(request.args['before'], '%Y-%m-%dT%H:%M:%S.%fZ')
+                before = before.replace(tzinfo=timezone.utc).timestamp()
+                end = min(end, max(math.ceil((before - group.start) / group.spacing), 0))
+
+            # Newest image at or below end - 1, then every image_every back
+            newest = (end - 1) - (end - 1) % group.image_every
+            positions = range(newest, -1, -group.image_every)[:limit] if end > 0 else []
+            if not positions:
+                return '', 304
+            messages = [group.message(p, self.url) for p in positions]
+            return jsonify(response={'messages': messages})
+
+        @app.route('/pictures', methods=['POST'])
+        def upload_picture():
+            with self._lock:
+                name = sum(self.calls.values())
+            url = f'{self.url}/images/upload{name}.jpeg'
+            return jsonify(payload={'url': url, 'picture_url': url})
+
+        @app.route('/images/<name>')
+        def image(name):
+            return self._sample_image(), 200, {'Content-Type': 'image/jpeg'}
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--groups', type=int, default=3)
+    parser.add_argument('--members', type=int, default=25)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds per request')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--callback-url', default='http://localhost:5000/callback')
+    args = parser.parse_args()
+
+    fake = FakeGroupMe(args.groups, args.members, args.messages, args.latency / 1000,
+                       args.callback_url).start(args.port)
+    print(f'Serving {args.groups} groups on {fake.url}')
+    print(f'  GROUPME_API_URL={fake.url}/v3/ GROUPME_IMAGE_URL={fake.url}/')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Runs GMBot against the local stand-in GroupMe API in
+benchmarks/fake_groupme.py and a temporary SQLite database. Reports
+/callback latency, stats job throughput, and the GroupMe API calls and
+database queries made per command.
+
+    $ python benchmarks/suite.py --groups 3 --messages 100000 --latency 20
+
+Queued commands are run in-process the way the RQ worker runs them.
+Command tables, usage counts and locks are shared through Redis, so a
+Redis server must be reachable at REDISTOGO_URL.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_groupme import FakeGroupMe  # noqa: E402
+
+BASE_URL = 'http://gmbot.benchmark'
+
+CALLBACKS = [
+    ('chat message', 'anyone around tonight?'),
+    ('custom command', '!hello'),
+    ('unknown command', '!nope'),
+    ('!commands', '!commands'),
+    ('!someone', '!someone'),
+    ('!everyone', '!everyone'),
+    ('!mod', '!mod Member 0'),
+]
+
+
+def start_fake(args):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    fake = FakeGroupMe(args.groups, args.members, args.messages, args.latency / 1000,
+                       callback_url=BASE_URL + '/callback').start()
+    os.environ['GROUPME_API_URL'] = fake.url + '/v3/'
+    os.environ['GROUPME_IMAGE_URL'] = fake.url + '/'
+    os.environ['BASE_URL'] = BASE_URL
+    os.environ['BOT_POST_RATE'] = '1000000'
+    os.environ['BOT_POST_BURST'] = '1000000'
+    os.environ['METRICS_FLUSH_INTERVAL'] = '86400'
+    os.environ.setdefault('GROUPME_TOKEN', 'benchmark')
+    os.environ.setdefault('REDISTOGO_URL', 'redis://localhost:6379/0')
+    return fake
+
+
+class Probe:
+    """Counts GroupMe API calls and database queries around a block of work"""
+
+    def __init__(self, fake, engine):
+        from sqlalchemy import event
+
+        self.fake = fake
+        self.queries = 0
+        event.listen(engine, 'before_cursor_execute', self._count_query)
+
+    def _count_query(self, *args):
+        self.queries += 1
+
+    def measure(self, func, *args, **kwargs):
+        calls, queries = self.fake.snapshot(), self.queries
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        api_calls = self.fake.snapshot() - calls
+        return result, elapsed, api_calls, self.queries - queries
+
+
+def seed(db, bots):
+    from src.models import Command, Group, Member
+
+    for bot in bots:
+        db.session.add(Group(bot.group))
+        for member in bot.members:
+            db.session.add(Member(member, bot.group_id))
+        db.session.add(Command('hello', 'hi there', bot.group_id))
+    db.session.flush()
+    Member.query.filter_by(user_id=bots[0].me['user_id']).update({'is_mod': True})
+    db.session.commit()
+
+
+def load_bots(groupy_client, bots):
+    from src.bot import GroupMeBot
+
+    me = groupy_client.user.get_me()
+    for bot in groupy_client.bots.list():
+        group = groupy_client.groups.get(bot.group_id)
+        bots.add(GroupMeBot(bot.bot_id, bot=bot, group=group, me=me))
+    return list(bots)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def bench_callbacks(app, probe, bots, iterations):
+    client = app.test_client()
+    results = []
+    for name, text in CALLBACKS:
+        latencies, api_calls, queries = [], Counter(), 0
+        for i in range(iterations):
+            bot = bots[i % len(bots)]
+            payload = {'id': str(i), 'group_id': bot.group_id, 'user_id': bot.me['user_id'],
+                       'name': bot.me['name'], 'sender_type': 'user', 'text': text,
+                       'attachments': []}
+            _, elapsed, calls, count = probe.measure(client.post, '/callback', json=payload)
+            latencies.append(elapsed * 1000)
+            api_calls += calls
+            queries += count
+        results.append((name, percentile(latencies, 50), percentile(latencies, 99),
+                        sum(api_calls.values()) / iterations, queries / iterations))
+    return results
+
+
+def bench_jobs(fake, probe, bots, new_messages):
+    from src import gallery, groupme
+    from src.bot import CommandContext, GroupMeBot
+
+    def run(command, bot, message=None):
+        sender = groupme.get_member(bot.group_id, user_id=bot.me['user_id'])
+        ctx = CommandContext(command, message, sender, bot)
+        return GroupMeBot.commands[command].command(ctx)
+
+    results = []
+
+    def record(name, messages, func, *args):
+        _, elapsed, calls, queries = probe.measure(func, *args)
+        results.append((name, elapsed, messages / elapsed if messages else None,
+                        sum(calls.values()), queries))
+
+    for bot in bots:
+        group = fake.groups[bot.group_id]
+        record('!stats (full history)', group.count, run, 'stats', bot)
+        group.add_messages(new_messages)
+        record(f'!stats (+{new_messages} new)', new_messages, run, 'stats', bot)
+        record('!summary 1d', None, run, 'summary', bot, '1d')
+        record('gallery index', None, gallery.refresh_gallery, bot.group_id)
+        record('!jpeg', None, run, 'jpeg', bot, f'{fake.url}/images/sample.jpeg')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--groups', type=int, default=3)
+    parser.add_argument('--members', type=int, default=25)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--new-messages', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds per API call')
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    fake = start_fake(args)
+
+    from src import app, bots, db, groupy_client, utils
+    app.logger.setLevel('WARNING')
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False).name
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_file
+
+    try:
+        db.create_all()
+        loaded = load_bots(groupy_client, bots)
+        seed(db, loaded)
+        probe = Probe(fake, db.engine)
+
+        callbacks = bench_callbacks(app, probe, loaded, args.iterations)
+        jobs = bench_jobs(fake, probe, loaded, args.new_messages)
+        utils.flush_usage()
+    finally:
+        fake.stop()
+        os.remove(db_file)
+
+    print(f'{args.groups} groups x {args.members} members x {args.messages} messages, '
+          f'{args.latency:g}ms API latency\n')
+    print(f'/callback, {args.iterations} requests each')
+    print(f'{"command":<20}{"p50 ms":>10}{"p99 ms":>10}{"API calls":>12}{"queries":>10}')
+    for name, p50, p99, api_calls, queries in callbacks:
+        print(f'{name:<20}{p50:>10.2f}{p99:>10.2f}{api_calls:>12.1f}{queries:>10.1f}')
+
+    print('\nQueued jobs, run in-process')
+    print(f'{"job":<24}{"group":>7}{"seconds":>10}{"msgs/s":>10}{"API calls":>12}{"queries":>10}')
+    per_group = len(jobs) // len(loaded)
+    for i, (name, elapsed, rate, api_calls, queries) in enumerate(jobs):
+        rate = f'{rate:,.0f}' if rate else '-'
+        print(f'{name:<24}{i // per_group:>7}{elapsed:>10.2f}{rate:>10}'
+              f'{api_calls:>12}{queries:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 
-from src import app, db, groupme, q
+from src import app, db, groupme, jobs, loader, refresh
 from src.bot import CommandContext, GroupMeBot
 
 migrate = Migrate(app, db)
@@ -40,12 +40,19 @@ def test_command(command_name, args=None):
     cmd_ctx = CommandContext(**command_args)
 
     if command_obj.queue:
-        q.enqueue(command_obj.command, cmd_ctx)
+        jobs.enqueue_command(command_obj, cmd_ctx)
     elif command_obj.extra_args and args is None:
         test_bot.send(command_obj.help)
     else:
         command_obj.command(cmd_ctx)
 
 
+@manager.command
+def refresh_stats(workers=None):
+    if not loader.warm_start():
+        loader.refresh_bots()
+    refresh.refresh_all(int(workers) if workers else None)
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,65 @@
+"""Add messages table and lookup indexes
+
+Revision ID: 3f1c9a2b7d41
+Revises: 
+Create Date: 2026-10-18 10:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'messages',
+        sa.Column('id', sa.String(length=30), nullable=False),
+        sa.Column('group_id', sa.String(length=20), nullable=True),
+        sa.Column('user_id', sa.String(length=20), nullable=True),
+        sa.Column('name', sa.String(length=100), nullable=True),
+        sa.Column('sender_type', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('favorited_by', sa.PickleType(), nullable=True),
+        sa.Column('attachments', sa.PickleType(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_messages_group_created', 'messages',
+                    ['group_id', 'created_at'], unique=False)
+
+    # Drop duplicate rows left behind by repeated !initialize calls before
+    # the unique indexes are created
+    op.execute('DELETE FROM members WHERE id NOT IN '
+               '(SELECT MIN(id) FROM members GROUP BY group_id, user_id)')
+    op.execute('DELETE FROM commands WHERE id NOT IN '
+               '(SELECT MIN(id) FROM commands GROUP BY group_id, command)')
+
+    op.create_index('uq_members_group_user', 'members',
+                    ['group_id', 'user_id'], unique=True)
+    op.create_index('ix_members_group_mod', 'members',
+                    ['group_id', 'is_mod'], unique=False)
+    op.create_index('ix_members_group_ignored', 'members',
+                    ['group_id', 'is_ignored'], unique=False)
+    op.create_index('uq_commands_group_command', 'commands',
+                    ['group_id', 'command'], unique=True)
+    op.create_index(op.f('ix_reminders_group_id'), 'reminders',
+                    ['group_id'], unique=False)
+    op.create_index(op.f('ix_reminders_remind_time'), 'reminders',
+                    ['remind_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_reminders_remind_time'), table_name='reminders')
+    op.drop_index(op.f('ix_reminders_group_id'), table_name='reminders')
+    op.drop_index('uq_commands_group_command', table_name='commands')
+    op.drop_index('ix_members_group_ignored', table_name='members')
+    op.drop_index('ix_members_group_mod', table_name='members')
+    op.drop_index('uq_members_group_user', table_name='members')
+    op.drop_index('ix_messages_group_created', table_name='messages')
+    op.drop_table('messages')
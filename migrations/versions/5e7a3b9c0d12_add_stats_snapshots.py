@@ -0,0 +1,33 @@
+"""Add stats_snapshots table
+
+Revision ID: 5e7a3b9c0d12
+Revises: c4d90e6a1f27
+Create Date: 2026-10-18 12:20:05.662914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7a3b9c0d12'
+down_revision = 'c4d90e6a1f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stats_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.String(length=20), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('view', sa.PickleType(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('group_id')
+    )
+
+
+def downgrade():
+    op.drop_table('stats_snapshots')
@@ -0,0 +1,38 @@
+"""Add normalized member usernames
+
+Revision ID: 7c4e2a9d1b38
+Revises: d3b81f4e6c52
+Create Date: 2026-10-18 15:08:51.662940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.names import normalize
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a9d1b38'
+down_revision = 'd3b81f4e6c52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('members', sa.Column('username_key', sa.String(length=100), nullable=True))
+    op.create_index('ix_members_group_username', 'members', ['group_id', 'username_key'],
+                    unique=False, postgresql_ops={'username_key': 'varchar_pattern_ops'})
+
+    # Keys are built with the same normalization lookups use; SQL lower()
+    # neither case folds nor collapses whitespace
+    members = sa.table('members', sa.column('id', sa.Integer), sa.column('username', sa.String),
+                       sa.column('username_key', sa.String))
+    conn = op.get_bind()
+    for member_id, username in conn.execute(sa.select([members.c.id, members.c.username])).fetchall():
+        conn.execute(members.update().where(members.c.id == member_id)
+                     .values(username_key=normalize(username or '')))
+
+
+def downgrade():
+    op.drop_index('ix_members_group_username', table_name='members')
+    op.drop_column('members', 'username_key')
@@ -0,0 +1,35 @@
+"""Add gallery_images table
+
+Revision ID: 8b2e47c1d5a9
+Revises: 3f1c9a2b7d41
+Create Date: 2026-10-18 11:03:27.904311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e47c1d5a9'
+down_revision = '3f1c9a2b7d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'gallery_images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.String(length=20), nullable=True),
+        sa.Column('position', sa.Integer(), nullable=True),
+        sa.Column('message_id', sa.String(length=30), nullable=True),
+        sa.Column('url', sa.String(length=500), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_gallery_group_position', 'gallery_images',
+                    ['group_id', 'position'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_gallery_group_position', table_name='gallery_images')
+    op.drop_table('gallery_images')
@@ -0,0 +1,40 @@
+"""Add backfills table
+
+Revision ID: a61d5c8e2f93
+Revises: 5e7a3b9c0d12
+Create Date: 2026-10-18 14:35:12.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61d5c8e2f93'
+down_revision = '5e7a3b9c0d12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'backfills',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.String(length=20), nullable=True),
+        sa.Column('phase', sa.String(length=20), nullable=True),
+        sa.Column('last_created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_message_id', sa.String(length=30), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=True),
+        sa.Column('like_count', sa.Integer(), nullable=True),
+        sa.Column('ml_likes', sa.Integer(), nullable=True),
+        sa.Column('ml_message', sa.String(length=1000), nullable=True),
+        sa.Column('counts', sa.PickleType(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('group_id')
+    )
+
+
+def downgrade():
+    op.drop_table('backfills')
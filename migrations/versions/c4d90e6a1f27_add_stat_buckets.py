@@ -0,0 +1,44 @@
+"""Add stat_buckets table and messages.like_count
+
+Revision ID: c4d90e6a1f27
+Revises: 8b2e47c1d5a9
+Create Date: 2026-10-18 11:48:52.117630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d90e6a1f27'
+down_revision = '8b2e47c1d5a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stat_buckets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.String(length=20), nullable=True),
+        sa.Column('user_id', sa.String(length=20), nullable=True),
+        sa.Column('resolution', sa.Integer(), nullable=True),
+        sa.Column('bucket_start', sa.DateTime(), nullable=True),
+        sa.Column('messages', sa.Integer(), nullable=True),
+        sa.Column('likes_received', sa.Integer(), nullable=True),
+        sa.Column('likes_given', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_stat_buckets_group_bucket', 'stat_buckets',
+                    ['group_id', 'resolution', 'bucket_start', 'user_id'], unique=True)
+    op.create_index('ix_stat_buckets_group_start', 'stat_buckets',
+                    ['group_id', 'bucket_start'], unique=False)
+    op.add_column('messages', sa.Column('like_count', sa.Integer(),
+                                        nullable=True, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('messages', 'like_count')
+    op.drop_index('ix_stat_buckets_group_start', table_name='stat_buckets')
+    op.drop_index('uq_stat_buckets_group_bucket', table_name='stat_buckets')
+    op.drop_table('stat_buckets')
@@ -0,0 +1,24 @@
+"""Add roster hash to groups
+
+Revision ID: d3b81f4e6c52
+Revises: a61d5c8e2f93
+Create Date: 2026-10-18 14:52:37.104518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3b81f4e6c52'
+down_revision = 'a61d5c8e2f93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('groups', sa.Column('roster_hash', sa.String(length=40), nullable=True))
+
+
+def downgrade():
+    op.drop_column('groups', 'roster_hash')
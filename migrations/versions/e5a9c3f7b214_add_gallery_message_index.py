@@ -0,0 +1,25 @@
+"""Index gallery images by message
+
+Revision ID: e5a9c3f7b214
+Revises: 7c4e2a9d1b38
+Create Date: 2026-10-18 15:31:06.219584
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c3f7b214'
+down_revision = '7c4e2a9d1b38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_gallery_group_message', 'gallery_images',
+                    ['group_id', 'message_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_gallery_group_message', table_name='gallery_images')
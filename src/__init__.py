@@ -1,6 +1,6 @@
 # gmbot.__init__.py
 
-import configparser
+import json
 import logging
 import os
 import re
@@ -9,12 +9,13 @@ from datetime import datetime
 from flask import Flask, render_template
 from flask_bootstrap import Bootstrap
 from flask_sqlalchemy import SQLAlchemy
+from groupy.api.base import Manager
 from groupy.client import Client
 from jinja2 import evalcontextfilter, Markup
 from rq import Queue
-from ruamel.yaml import YAML
 
-from src.worker import conn
+from src.registry import BotRegistry
+from src.worker import conn, listen
 
 app = Flask(
     __name__,
@@ -35,14 +36,17 @@ handler.formatter = logging.Formatter(
 )
 app.logger.addHandler(handler)
 
-q = Queue(connection=conn)
+queues = {name: Queue(name, connection=conn) for name in listen}
 bootstrap = Bootstrap(app)
 db = SQLAlchemy(app)
 
 groupme_token = app.config['GROUPME_TOKEN']
+# Groupy managers build their URLs from this when they're created, so it
+# has to be set before the client is
+Manager.base_url = app.config['GROUPME_API_URL']
 groupy_client = Client.from_token(groupme_token)
 
-bots = []
+bots = BotRegistry()
 
 
 class StringManager:
@@ -60,31 +64,38 @@ class StringResource:
             setattr(self, k, v)
 
 
-yaml = YAML()
-strings = StringManager(yaml.load(open('resources/strings.yml', 'r')))
+def load_strings(yaml_path, cache_path):
+    """
+    Loads the string resources, reading the YAML file only when the cached
+    JSON copy is missing or older than it
 
+    :param yaml_path: Path of the strings YAML file
+    :param cache_path: Path of the compiled JSON copy
+    :return: dict of string resources
+    """
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(yaml_path):
+            with open(cache_path, 'r') as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
 
-from src.bot import GroupMeBot
-from src.views import main_blueprint
-app.register_blueprint(main_blueprint)
+    from ruamel.yaml import YAML
+    raw = json.loads(json.dumps(YAML().load(open(yaml_path, 'r'))))
+    try:
+        with open(cache_path, 'w') as f:
+            json.dump(raw, f)
+    except OSError:
+        pass
+    return raw
 
 
-@app.before_first_request
-def load_bots():
-    """
-    Loads all bots from bots.ini into a list accessible to the rest of the
-    application
-    """
-    config = configparser.ConfigParser(interpolation=None)
-    config.read('bots.ini')
+strings = StringManager(load_strings('resources/strings.yml', 'resources/strings.json'))
 
-    for bot in groupy_client.bots.list():
-        if bot.callback_url == app.config['BASE_URL'] + '/callback':
-            bots.append(GroupMeBot(bot.bot_id))
 
-    for bot in bots:
-        app.logger.info(f'{bot.group.name} loaded...')
-    return bots
+from src.bot import GroupMeBot
+from src.views import main_blueprint
+app.register_blueprint(main_blueprint)
 
 
 @app.errorhandler(401)
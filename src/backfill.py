@@ -0,0 +1,103 @@
+import time
+
+from src import app, db, ingest, refresh, utils
+from src import stats as group_stats
+from src.models import Backfill, Group, Member, Message
+from src.worker import conn
+
+
+def lock_key(group_id):
+    return f'gmbot:backfill:{group_id}'
+
+
+def acquire_lock(group_id):
+    """
+    Claims a group's backfill so two jobs never fold the same pages into
+    its checkpoint
+
+    :param group_id: Group ID of the group
+    :return: True if the lock was acquired
+    """
+    return bool(conn.set(lock_key(group_id), 1, nx=True,
+                         ex=app.config['COMMAND_JOB_TIMEOUT']))
+
+
+def release_lock(group_id):
+    conn.delete(lock_key(group_id))
+
+
+def run_backfill(bot, deadline=None):
+    """
+    Recounts a group's message and like counters from its whole history.
+
+    Messages older than anything stored are fetched from GroupMe first,
+    then the stored history is tallied a page at a time, oldest first.
+    A checkpoint holding the last tallied message and the partial
+    aggregates is committed after every page, and the members' counters
+    are only replaced once the whole history has been tallied. A run that
+    stops at `deadline` (or is interrupted) resumes from the checkpoint.
+
+    :param bot: The bot within the group to backfill
+    :param deadline: time.time() value to stop after, defaults to None (no limit)
+    :return: True if the backfill finished and the counters were replaced
+    """
+    checkpoint = Backfill.get_backfill(bot.group_id)
+    if checkpoint is None:
+        checkpoint = Backfill(bot.group_id)
+        db.session.add(checkpoint)
+        db.session.commit()
+
+    if checkpoint.phase == Backfill.FETCHING:
+        if not ingest.backfill_messages(bot, deadline):
+            return False
+        checkpoint.phase = Backfill.TALLYING
+        db.session.commit()
+
+    if not _tally(checkpoint, deadline):
+        return False
+
+    # Taken so a !stats or fleet refresh can't add counts between the swap
+    # reading and replacing them
+    with refresh.stats_lock(bot.group_id):
+        _swap(checkpoint)
+    return True
+
+
+def _tally(checkpoint, deadline):
+    page_size = app.config['BACKFILL_PAGE_SIZE']
+    user_ids = {member.user_id for member in Member.get_members(checkpoint.group_id)}
+
+    while True:
+        page = Message.get_page(checkpoint.group_id, checkpoint.position, page_size)
+        if not page:
+            return True
+
+        counts, like_count, most_liked = group_stats.tally(page, user_ids,
+                                                           checkpoint.ml_likes)
+        checkpoint.add_page(page, counts, like_count, most_liked)
+        db.session.commit()
+
+        if deadline is not None and time.time() >= deadline:
+            app.logger.info(f'Backfill of {checkpoint.group_id} paused after '
+                            f'{checkpoint.message_count} messages')
+            return False
+
+
+def _swap(checkpoint):
+    # Counters, group totals and the high-water mark change in the same
+    # commit that drops the checkpoint, so readers never see a partial count
+    group_id, message_count = checkpoint.group_id, checkpoint.message_count
+    members = {member.user_id: member for member in Member.get_members(group_id)}
+    Member.set_counts(members, checkpoint.counts)
+
+    db_group = Group.get_group(group_id)
+    db_group.like_count = checkpoint.like_count
+    db_group.ml_likes = checkpoint.ml_likes
+    db_group.ml_message = checkpoint.ml_message
+    if checkpoint.last_created_at is not None:
+        db_group.last_updated = checkpoint.last_created_at
+
+    db.session.delete(checkpoint)
+    db.session.commit()
+    utils.invalidate_info(group_id)
+    app.logger.info(f'Backfill of {group_id} finished: {message_count} messages')
@@ -1,8 +1,7 @@
 # gmbot.bot.__init__.py
 
-from gmbot import groupme
-from gmbot.bot.groupmebot import GroupMeBot
-from gmbot.models import Group, Member
+from src.bot.groupmebot import GroupMeBot
+from src.models import Group, Member
 
 
 class CommandContext:
@@ -11,6 +10,7 @@ class CommandContext:
     was called.
 
     A CommandContext object is sent as an argument to all built-in commands.
+    The database group and sender are only loaded when a command uses them.
     """
 
     def __init__(self, command, message, sender, bot):
@@ -21,6 +21,26 @@ class CommandContext:
         self.group = self.bot.group
         self.group_id = self.group.group_id
 
-        self.db_group = Group.get_group(self.group_id)
-        self.db_sender = Member.get_member(self.group_id,
-                                           user_id=sender.user_id)
+        self._db_group = None
+        self._db_sender = None
+
+    @property
+    def db_group(self):
+        if self._db_group is None:
+            self._db_group = Group.get_group(self.group_id)
+        return self._db_group
+
+    @property
+    def db_sender(self):
+        if self._db_sender is None:
+            self._db_sender = Member.get_member(self.group_id,
+                                                user_id=self.sender.user_id)
+        return self._db_sender
+
+    def __getstate__(self):
+        # Database rows are reloaded in the worker's own session rather
+        # than pickled as detached objects
+        state = self.__dict__.copy()
+        state['_db_group'] = None
+        state['_db_sender'] = None
+        return state
@@ -1,17 +1,14 @@
-import io
 import math
 import random
 import time
-import urllib.request
-from datetime import datetime, timedelta
+from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 from groupy import attachments
-from PIL import Image, ImageEnhance, ImageOps
 
-from src import app, db, groupme, strings, utils
+from src import app, db, gallery, scheduler, strings, utils
 from src.bot import CommandContext, GroupMeBot
-from src.models import Command, Group, Member, Reminder
+from src.models import Command, Group, Member, Reminder, StatsSnapshot
 
 RNG = random.SystemRandom()
 
@@ -24,6 +21,10 @@ def reset(ctx: CommandContext):
     db_members = Member.get_members(ctx.group_id)
     db.session.delete(ctx.db_group)
 
+    snapshot = StatsSnapshot.get_snapshot(ctx.group_id)
+    if snapshot is not None:
+        db.session.delete(snapshot)
+
     for member in db_members:
         db.session.delete(member)
 
@@ -43,12 +44,7 @@ def initialize(ctx: CommandContext):
 
     new_group = Group(ctx.group)
     db.session.add(new_group)
-
-    ctx.bot.refresh()
-    for member in ctx.bot.members:
-        Member.create_member(member)
-
-    db.session.commit()
+    Member.save_new_members(ctx.bot)
 
     ctx.bot.send('Group successfully initialized')
 
@@ -66,6 +62,7 @@ def add(ctx: CommandContext):
 
             command.description = desription
             db.session.commit()
+            utils.invalidate_commands(ctx.group_id)
             ctx.bot.send(f'{command_name} description added!')
         except IndexError:
             ctx.bot.send(strings.add.error)
@@ -79,6 +76,7 @@ def add(ctx: CommandContext):
                 new_command = Command(command, response, ctx.group_id)
                 db.session.add(new_command)
                 db.session.commit()
+                utils.invalidate_commands(ctx.group_id)
                 ctx.bot.send(strings.add.success.format(command))
             else:
                 ctx.bot.send(strings.add.failure.format(command))
@@ -97,6 +95,7 @@ def edit(ctx: CommandContext):
         cmd = Command.get_command(ctx.group_id, command)
         cmd.response = response
         db.session.commit()
+        utils.invalidate_commands(ctx.group_id)
         ctx.bot.send(strings.edit.success.format(command))
     except IndexError:
         ctx.bot.send(strings.edit.error)
@@ -111,18 +110,39 @@ def delete(ctx: CommandContext):
         command = Command.get_command(ctx.group_id, ctx.message)
         db.session.delete(command)
         db.session.commit()
+        utils.invalidate_commands(ctx.group_id)
         ctx.bot.send(strings.delete.success.format(ctx.message))
     else:
         ctx.send(strings.delete.error.format(ctx.message))
 
 
+def find_member(ctx: CommandContext):
+    """
+    Looks up the member named by a moderator command. Only an exact name or
+    @mention is acted on; a name that is the start of exactly one member's
+    name gets a suggestion to confirm with instead.
+
+    :return: Member database entry, or None after replying
+    """
+    Member.save_new_members(ctx.bot)
+    member = Member.get_member(ctx.group_id, username=ctx.message)
+    if member is None:
+        suggestion = Member.match_prefix(ctx.group_id, ctx.message or '')
+        if suggestion is not None:
+            ctx.bot.send(strings.member.suggest.format(ctx.command, suggestion.username))
+        else:
+            ctx.bot.send(strings.member.not_found.format(ctx.message))
+    return member
+
+
 @GroupMeBot.command('mod', restricted=True)
 def mod(ctx: CommandContext):
     """
     Add a moderator to the bot
     """
-    Member.save_new_members(ctx.bot)
-    member = Member.get_member(ctx.group_id, username=ctx.message)
+    member = find_member(ctx)
+    if member is None:
+        return
 
     if member.is_mod:
         ctx.bot.send(f'{member.username} is already a mod')
@@ -130,6 +150,7 @@ def mod(ctx: CommandContext):
 
     member.is_mod = True
     db.session.commit()
+    utils.invalidate_info(ctx.group_id)
     ctx.bot.send(f'{member.username} added as a mod')
 
 
@@ -138,10 +159,14 @@ def unmod(ctx: CommandContext):
     """
     Remove a moderator from the bot
     """
-    member = Member.get_member(ctx.group_id, username=ctx.message)
+    member = find_member(ctx)
+    if member is None:
+        return
+
     if member.is_mod:
         member.is_mod = False
         db.session.commit()
+        utils.invalidate_info(ctx.group_id)
         ctx.bot.send(f'{member.username} removed as mod')
     else:
         ctx.bot.send(f'{member.username} is not a mod')
@@ -161,8 +186,10 @@ def ignore(ctx: CommandContext):
     Ignore a specific member from the bot.
     Prevents that user from issuing any commands.
     """
-    Member.save_new_members(ctx.bot)
-    victim = Member.get_member(ctx.group_id, username=ctx.message)
+    victim = find_member(ctx)
+    if victim is None:
+        return
+
     mods = [mod.user_id for mod in Member.get_mods(ctx.group_id)]
     if victim.user_id in mods:
         ctx.bot.send('You can not ignore a mod')
@@ -178,7 +205,10 @@ def ignore(ctx: CommandContext):
 
 @GroupMeBot.command('unignore', restricted=True)
 def unignore(ctx: CommandContext):
-    ex_con = Member.get_member(ctx.group_id, username=ctx.message)
+    ex_con = find_member(ctx)
+    if ex_con is None:
+        return
+
     if ex_con.is_ignored:
         ex_con.is_ignored = False
         db.session.commit()
@@ -187,67 +217,6 @@ def unignore(ctx: CommandContext):
         ctx.bot.send(f'{ex_con.username} is not currently ignored')
 
 
-@GroupMeBot.command('stats', queue=True)
-def stats(ctx: CommandContext, new_messages: list=None):
-    """
-    Gathers and sends a message containing total messages, likes,
-    users' total likes, and most liked messages from a GroupMe group
-
-    :param bot: bot to gather info from and send message
-    """
-    ctx.bot.send('Gathering group stats')
-    ctx.bot.refresh()
-    Member.save_new_members(ctx.bot)
-    db_group = Group.get_group(ctx.group_id)
-
-    if new_messages is None:
-        new_messages = groupme.load_messages(ctx.bot, db_group.last_updated)
-
-    total_likes = 0
-    for message in new_messages:
-        try:
-            db_member = Member.get_member(ctx.group_id, user_id=message.user_id)
-            db_member.message_count += 1
-            db_member.like_count += len(message.favorited_by)
-
-            for user_id in message.favorited_by:
-                total_likes += 1
-                Member.get_member(ctx.group_id, user_id=user_id).likes_given += 1
-
-            if len(message.favorited_by) >= db_group.ml_likes:
-                db_group.ml_likes = len(message.favorited_by)
-                db_group.ml_message = f'{message.name}: {message.text}'
-        except AttributeError:
-            # Throws an AttributeError when it comes across a message from a
-            # bot since they aren't real members.
-            pass
-
-    db_group.update(ctx.group, total_likes, new_messages[0].created_at)
-    db.session.commit()
-
-    ctx.bot.send(f'{app.config["BASE_URL"]}/stats?group_id={ctx.group_id}')
-
-
-@GroupMeBot.command('slow_stats', queue=True, hidden=True)
-def slow_stats(ctx: CommandContext):
-    """
-    Loads every message in a group and sends it to stats function
-    """
-    members = Member.get_members(ctx.group_id)
-
-    for member in members:
-        member.like_count = 0
-        member.message_count = 0
-        member.likes_given = 0
-
-    ctx.bot.refresh()
-    ctx.bot.send('Loading all messages...')
-    messages = list(ctx.group.messages.list_all())
-    ctx.db_group.last_updated = messages[-1].created_at
-    db.session.commit()
-    stats(ctx, new_messages=messages)
-
-
 @GroupMeBot.command('roll', extra_args=True)
 def roll(ctx: CommandContext):
     """
@@ -281,47 +250,6 @@ def flip(ctx: CommandContext):
         ctx.bot.send('Tails')
 
 
-@GroupMeBot.command('jpeg', extra_args=True)
-def jpegify(ctx: CommandContext):
-    """
-    Turns any image into a terrible quality .jpeg image
-    """
-    img_path = io.BytesIO(urllib.request.urlopen(ctx.message).read())
-    img = Image.open(img_path)
-
-    if img.mode in ('RGBA', 'P'):
-        img = img.convert('RGB')
-
-    # Absolutely devastate the image
-    width, height = img.width, img.height
-    img = img.resize((int(width ** .75), int(height ** .75)), resample=Image.LANCZOS)
-    img = img.resize((int(width ** .88), int(height ** .88)), resample=Image.BILINEAR)
-    img = img.resize((int(width ** .9), int(height ** .9)), resample=Image.BICUBIC)
-    img = img.resize((width, height), resample=Image.BICUBIC)
-    img = ImageOps.posterize(img, 4)
-
-    # Generate red and yellow overlay for classic deepfry effect
-    r = img.split()[0]
-    r = ImageEnhance.Contrast(r).enhance(2.0)
-    r = ImageEnhance.Brightness(r).enhance(1.5)
-    r = ImageOps.colorize(r, (254, 0, 2), (255, 255, 15))
-
-    # Overlay red and yellow onto main image and sharpen
-    img = Image.blend(img, r, 0.75)
-    img = ImageEnhance.Sharpness(img).enhance(100.0)
-
-    temp = io.BytesIO()
-    img.save(temp, format='JPEG')
-    temp.seek(0)
-
-    with open('tempjpg.jpeg', 'wb') as f:
-        f.write(temp.read())
-
-    img_attach = groupme.create_image_attachment('tempjpg.jpeg')
-    ctx.bot.send(img_attach.url)
-    temp.close()
-
-
 @GroupMeBot.command('everyone')
 def everyone(ctx: CommandContext):
     """
@@ -360,117 +288,41 @@ def remindme(ctx: CommandContext):
     message = ctx.message.split(' ', 2)[2]
 
     if 'minute' in unit:
-        remind_time = datetime.now() + relativedelta(minutes=+amount)
+        remind_time = datetime.utcnow() + relativedelta(minutes=+amount)
     elif 'hour' in unit:
-        remind_time = datetime.now() + relativedelta(hours=+amount)
+        remind_time = datetime.utcnow() + relativedelta(hours=+amount)
     elif 'day' in unit:
-        remind_time = datetime.now() + relativedelta(days=+amount)
+        remind_time = datetime.utcnow() + relativedelta(days=+amount)
     elif 'week' in unit:
-        remind_time = datetime.now() + relativedelta(weeks=+amount)
+        remind_time = datetime.utcnow() + relativedelta(weeks=+amount)
     elif 'month' in unit:
-        remind_time = datetime.now() + relativedelta(months=+amount)
+        remind_time = datetime.utcnow() + relativedelta(months=+amount)
     elif 'year' in unit:
-        remind_time = datetime.now() + relativedelta(years=+amount)
+        remind_time = datetime.utcnow() + relativedelta(years=+amount)
     else:
         ctx.bot.send(strings.remindme.unit_error)
+        return
 
     new_reminder = Reminder(ctx.sender.user_id, ctx.group_id, message, remind_time)
     db.session.add(new_reminder)
     db.session.commit()
+    scheduler.notify(new_reminder)
 
     ctx.bot.send(f'I will remind you in {amount} {unit} about {message}')
 
 
-@GroupMeBot.command('summary', queue=True)
-def summary(ctx: CommandContext):
-    """
-    Gives a brief stat summary of the past 2 hours
-    """
-    tstamp = ctx.bot.group.messages.list()[0].created_at - timedelta(hours=2)
-    messages = groupme.load_messages(ctx.bot, tstamp)
-    member_info = {
-        'likes_given': {},
-        'likes_recv': {},
-        'messages': {},
-        'ratio': {},
-    }
-    for member in ctx.bot.members:
-        member_info['likes_given'][member.user_id] = 0
-        member_info['likes_recv'][member.user_id] = 0
-        member_info['messages'][member.user_id] = 0
-        member_info['ratio'][member.user_id] = 0
-
-    message_count = len(messages)
-    total_likes = 0
-    most_likes = 0
-    most_liked_msg = None
-    for message in messages:
-        try:
-            member_info['likes_recv'][message.user_id] += len(message.favorited_by)
-            member_info['messages'][message.user_id] += 1
-        except KeyError:
-            pass
-
-        if len(message.favorited_by) > most_likes:
-            most_likes = len(message.favorited_by)
-            if message.attachments:
-                for attachment in message.attachments:
-                    if attachment.type == 'image':
-                        most_liked_msg = attachment.url
-            else:
-                most_liked_msg = message.text
-
-        for like in message.favorited_by:
-            try:
-                member_info['likes_given'][like] += 1
-            except KeyError:
-                pass
-            total_likes += 1
-
-    for member in ctx.bot.members:
-        try:
-            ratio = member_info['likes_recv'][member.user_id] / member_info['messages'][member.user_id]
-            member_info['ratio'][member.user_id] = round(ratio, 2)
-        except ZeroDivisionError:
-            member_info['ratio'][member.user_id] = 0.0
-
-    # TODO make this not terrible
-    max_recv = utils.max_dict(member_info['likes_recv'])
-    max_given = utils.max_dict(member_info['likes_given'])
-    max_msg = utils.max_dict(member_info['messages'])
-    max_ratio = utils.max_dict(member_info['ratio'])
-    recv_name = groupme.get_member(ctx.group_id, user_id=max_recv).nickname
-    give_name = groupme.get_member(ctx.group_id, user_id=max_given).nickname
-    msg_name = groupme.get_member(ctx.group_id, user_id=max_msg).nickname
-    ratio_name = groupme.get_member(ctx.group_id, user_id=max_ratio).nickname
-    recv = member_info['likes_recv'][max_recv]
-    given = member_info['likes_given'][max_given]
-    sent = member_info['messages'][max_msg]
-    ratio = member_info['ratio'][max_ratio]
-
-    message = (f'Summary of the past 2 hours:\n\n'
-               f'Messages sent: {message_count}\n'
-               f'Likes given out: {total_likes}\n\n'
-               f'Most likes received:\n\xa0\xa0{recv_name} - {recv}\n'
-               f'Most likes given:\n\xa0\xa0{give_name} - {given}\n'
-               f'Most messages sent:\n\xa0\xa0{msg_name} - {sent}\n'
-               f'Best best like/message ratio:\n\xa0\xa0{ratio_name} - {ratio}\n\n'
-               f'Most liked message ({most_likes} likes):\n{most_liked_msg}')
-
-    ctx.bot.send(message)
-
-
 @GroupMeBot.command('randgal')
 def random_gallery(ctx: CommandContext):
     """
     Gets a random gallery picture and sends it to the group
     """
-    group = groupme.get_group(ctx.group_id)
-    gallery_list = list(group.gallery.list_all())
-    random_pic = random.choice(gallery_list)
-    for attachment in random_pic.attachments:
-        if attachment.type == 'image':
-            ctx.bot.send(attachment.url)
+    try:
+        url = gallery.random_image(ctx.group_id)
+    except gallery.IndexNotReady:
+        ctx.bot.send(strings.randgal.indexing)
+        return
+    if url is not None:
+        ctx.bot.send(url)
 
 
 @GroupMeBot.command('someone')
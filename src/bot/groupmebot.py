@@ -1,43 +1,68 @@
-from src import app, groupy_client, strings
+import importlib
+
+from src import app, groupme, groupy_client, metrics, outbound, strings
 
 
 class GroupMeBot:
 
     commands = {}
 
-    def __init__(self, b_id):
+    def __init__(self, b_id, bot=None, group=None, me=None):
         self.bot_id = b_id
+        self.bot = bot if bot is not None else self.resolve_bot()
         self.group_id = self.bot.group_id
-        self.group = groupy_client.groups.get(self.group_id)
+        if group is not None:
+            groupme.cache_group(group)
+            self.group = group
+        else:
+            self.group = groupme.get_group(self.group_id)
         self.msg_count = self.group.data['messages']['count']
         self.members = self.group.members
-        self.me = groupy_client.user.get_me()
+        self.me = me if me is not None else groupy_client.user.get_me()
         self.test_mode = False
 
-    @property
-    def bot(self):
+    def resolve_bot(self):
+        """
+        Look up the Groupy Bot object for this bot's id. Only needed when
+        the handle wasn't supplied or has gone stale.
+
+        :return: Groupy Bot object
+        """
         for bot in groupy_client.bots.list():
             if bot.bot_id == self.bot_id:
                 return bot
 
-    def send(self, message, attachments=None):
+    def send(self, message, attachments=None, background=False):
+        """
+        Send a message as the bot, split into 1000 character chunks
+
+        :param message: Text of the message
+        :param attachments: List of Groupy attachment objects, defaults to None
+        :param background: Deliver from the RQ worker instead of blocking the
+                           caller, defaults to False
+        """
         if self.test_mode:
             app.logger.info(f'\nMessage:\n{message}\n\nAttachments:\n{attachments}')
         else:
             char_limit = 1000
-            if len(message) > char_limit:
-                messages = [message[i:i + char_limit] for i in range(0, len(message), char_limit)]
-                for message in messages:
-                    self.bot.post(message, attachments=attachments)
+            # An empty message is still posted, e.g. for attachment-only sends
+            chunks = [message[i:i + char_limit]
+                      for i in range(0, len(message), char_limit)] or [message]
+            attachments = outbound.serialize_attachments(attachments)
+            if background:
+                outbound.enqueue(self.bot_id, chunks, attachments)
             else:
-                self.bot.post(message, attachments=attachments)
+                outbound.deliver(self.bot_id, chunks, attachments)
 
     def refresh(self):
         self.group.refresh_from_server()
+        self.members = self.group.members
+        groupme.invalidate_group(self.group_id)
+        groupme.cache_group(self.group)
 
     @classmethod
     def command(cls, name, extra_args=False, queue=False, restricted=False,
-                hidden=False):
+                hidden=False, priority='default'):
         """
         Use to add a built-in command to the active GroupMeBot objects
 
@@ -47,30 +72,78 @@ class GroupMeBot:
         :param restricted: If the command requires moderator status, set this
                            to True
         :param hidden: Set to true to hide in the commands page
+        :param priority: RQ queue a queued command runs from, one of 'high',
+                         'default' or 'low'
         """
         def wrapper(func):
+            func = metrics.timed_command(name.lower(), func)
             command_obj = Command(name.lower(), func, extra_args, queue,
-                                  restricted, hidden)
+                                  restricted, hidden, priority)
             cls.commands[name.lower()] = command_obj
             return func
         return wrapper
 
+    @classmethod
+    def lazy_command(cls, name, module, extra_args=False, queue=False,
+                     restricted=False, hidden=False, priority='default'):
+        """
+        Declare a built-in command whose implementation lives in `module`.
+        The module is only imported the first time the command is run, and
+        must mark the implementation with GroupMeBot.implements.
+
+        :param name: How the command will be called in the group chat.
+        :param module: Dotted path of the module implementing the command
+        :param queue: If the command will take longer than 180 seconds to complete,
+                      set this to True
+        :param restricted: If the command requires moderator status, set this
+                           to True
+        :param hidden: Set to true to hide in the commands page
+        :param priority: RQ queue a queued command runs from, one of 'high',
+                         'default' or 'low'
+        """
+        command_obj = Command(name.lower(), None, extra_args, queue,
+                              restricted, hidden, priority, module=module)
+        cls.commands[name.lower()] = command_obj
+
+    @classmethod
+    def implements(cls, name):
+        """
+        Use to attach the implementation of a command declared with
+        GroupMeBot.lazy_command
+
+        :param name: Name the command was declared with
+        """
+        def wrapper(func):
+            func = metrics.timed_command(name.lower(), func)
+            cls.commands[name.lower()].implementation = func
+            return func
+        return wrapper
+
     @classmethod
     def get_commands(cls):
         return [cmd for _, cmd in GroupMeBot.commands.items()]
 
     def load_messages(self):
-        return [message for message in self.group.messages.list_all()]
+        return groupme.iter_messages(self)
 
 
 class Command:
-    def __init__(self, name, command, extra_args, queue, restricted, hidden):
+    def __init__(self, name, command, extra_args, queue, restricted, hidden,
+                 priority='default', module=None):
         self.name = name
-        self.command = command
+        self.implementation = command
+        self.module = module
         self.extra_args = extra_args
         self.queue = queue
         self.restricted = restricted
         self.hidden = hidden
+        self.priority = priority
+
+    @property
+    def command(self):
+        if self.implementation is None:
+            importlib.import_module(self.module)
+        return self.implementation
 
     @property
     def help(self):
@@ -0,0 +1,20 @@
+from src import groupme, images, strings
+from src.bot import CommandContext, GroupMeBot
+
+
+@GroupMeBot.implements('jpeg')
+def jpegify(ctx: CommandContext):
+    """
+    Turns any image into a terrible quality .jpeg image
+    """
+    try:
+        data = images.jpegify(ctx.message)
+    except images.ImageTooLarge:
+        ctx.bot.send(strings.jpeg.too_large)
+        return
+    except images.ImageError:
+        ctx.bot.send(strings.jpeg.error)
+        return
+
+    img_attach = groupme.create_image_attachment(data)
+    ctx.bot.send(img_attach.url)
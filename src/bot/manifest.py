@@ -0,0 +1,11 @@
+from src.bot.groupmebot import GroupMeBot
+
+# Built-in commands whose implementations pull in heavy dependencies
+# (PIL/NumPy, message ingestion). Dispatch only needs their flags, so the
+# implementing modules are imported the first time one of them runs.
+GroupMeBot.lazy_command('jpeg', 'src.bot.image_commands', extra_args=True, queue=True,
+                        priority='high')
+GroupMeBot.lazy_command('stats', 'src.bot.stats_commands', queue=True, priority='low')
+GroupMeBot.lazy_command('slow_stats', 'src.bot.stats_commands', queue=True, hidden=True,
+                        priority='low')
+GroupMeBot.lazy_command('summary', 'src.bot.stats_commands', queue=True)
@@ -0,0 +1,118 @@
+import time
+from datetime import datetime
+
+from src import app, backfill, ingest, jobs, refresh, strings, utils
+from src import stats as group_stats
+from src.bot import CommandContext, GroupMeBot
+from src.models import Backfill, Member, Message, StatBucket
+
+
+@GroupMeBot.implements('stats')
+def stats(ctx: CommandContext):
+    """
+    Gathers and sends a message containing total messages, likes,
+    users' total likes, and most liked messages from a GroupMe group
+
+    :param bot: bot to gather info from and send message
+    """
+    ctx.bot.send('Gathering group stats')
+    with refresh.stats_lock(ctx.group_id):
+        refresh.refresh_stats(ctx.bot)
+    ctx.bot.send(f'{app.config["BASE_URL"]}/stats?group_id={ctx.group_id}')
+
+
+@GroupMeBot.implements('slow_stats')
+def slow_stats(ctx: CommandContext):
+    """
+    Recounts a group's stats from its entire message history, then runs
+    stats for anything newer. The backfill is checkpointed after every
+    page; when BACKFILL_TIME_BUDGET runs out the command is enqueued again
+    under its pending key and carries on from the checkpoint, so repeat
+    requests join the running recount instead of starting another.
+    """
+    if not backfill.acquire_lock(ctx.group_id):
+        ctx.bot.send('Stats are already being recounted for this group')
+        return
+
+    try:
+        if Backfill.get_backfill(ctx.group_id) is None:
+            ctx.bot.send('Loading all messages...')
+            Member.save_new_members(ctx.bot)
+        deadline = time.time() + app.config['BACKFILL_TIME_BUDGET']
+        finished = backfill.run_backfill(ctx.bot, deadline)
+    finally:
+        backfill.release_lock(ctx.group_id)
+
+    if not finished:
+        return jobs.CONTINUE
+    stats(ctx)
+
+
+@GroupMeBot.implements('summary')
+def summary(ctx: CommandContext):
+    """
+    Gives a brief stat summary of the past 2 hours, or of a window such
+    as !summary 1d
+    """
+    window = utils.parse_window(ctx.message or '2h')
+    if window is None:
+        ctx.bot.send(strings.summary.help)
+        return
+    window, label = window
+
+    # Likes on recent messages are corrected by the background ingest
+    since = datetime.utcnow() - window
+    ingest.ingest_messages(ctx.bot, since=since)
+    bucket_start = group_stats.floor_time(since, group_stats.BUCKET_LEVELS[0][0])
+    counts = StatBucket.sum_counts(ctx.group_id, bucket_start)
+
+    names = {member.user_id: member.nickname for member in ctx.bot.members}
+    member_info = {
+        'likes_given': {},
+        'likes_recv': {},
+        'messages': {},
+        'ratio': {},
+    }
+    for user_id in names:
+        count = counts.get(user_id, {'messages': 0, 'likes_received': 0, 'likes_given': 0})
+        member_info['likes_given'][user_id] = count['likes_given']
+        member_info['likes_recv'][user_id] = count['likes_received']
+        member_info['messages'][user_id] = count['messages']
+        try:
+            ratio = count['likes_received'] / count['messages']
+            member_info['ratio'][user_id] = round(ratio, 2)
+        except ZeroDivisionError:
+            member_info['ratio'][user_id] = 0.0
+
+    message_count = sum(count['messages'] for count in counts.values())
+    total_likes = sum(count['likes_received'] for count in counts.values())
+
+    most_likes = 0
+    most_liked_msg = None
+    most_liked = Message.get_most_liked(ctx.group_id, since)
+    if most_liked is not None and most_liked.like_count:
+        most_likes = most_liked.like_count
+        most_liked_msg = most_liked.text
+        for attachment in most_liked.attachments:
+            if attachment['type'] == 'image':
+                most_liked_msg = attachment['url']
+
+    max_recv = utils.max_dict(member_info['likes_recv'])
+    max_given = utils.max_dict(member_info['likes_given'])
+    max_msg = utils.max_dict(member_info['messages'])
+    max_ratio = utils.max_dict(member_info['ratio'])
+    recv = member_info['likes_recv'][max_recv]
+    given = member_info['likes_given'][max_given]
+    sent = member_info['messages'][max_msg]
+    ratio = member_info['ratio'][max_ratio]
+
+    message = (f'Summary of the past {label}:\n\n'
+               f'Messages sent: {message_count}\n'
+               f'Likes given out: {total_likes}\n\n'
+               f'Most likes received:\n\xa0\xa0{names[max_recv]} - {recv}\n'
+               f'Most likes given:\n\xa0\xa0{names[max_given]} - {given}\n'
+               f'Most messages sent:\n\xa0\xa0{names[max_msg]} - {sent}\n'
+               f'Best best like/message ratio:\n\xa0\xa0{names[max_ratio]} - {ratio}\n\n'
+               f'Most liked message ({most_likes} likes):\n{most_liked_msg}')
+
+    ctx.bot.send(message)
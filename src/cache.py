@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache. Entries expire after `ttl` seconds
+    and the least recently used entry is evicted once `maxsize` is reached.
+    """
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """
+        Retrieve a value from the cache
+
+        :param key: Key of the cached value
+        :param default: Value returned on a miss or expired entry, defaults to None
+        :return: Cached value or default
+        """
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value in the cache, evicting the oldest entries if full
+
+        :param key: Key of the value
+        :param value: Value to store
+        :param ttl: Seconds until the entry expires, defaults to the cache ttl
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, loader, ttl=None):
+        """
+        Retrieve a value from the cache, calling `loader` to fill it on a miss
+
+        :param key: Key of the value
+        :param loader: Callable with no arguments that produces the value
+        :param ttl: Seconds until a newly loaded entry expires, defaults to None
+        :return: Cached or freshly loaded value
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class VersionedCache:
+    """
+    TTLCache whose entries are also dropped when any process bumps the
+    entry's version counter in Redis, so an invalidation made by one web
+    or worker process reaches every other process on its next read.
+    """
+
+    def __init__(self, conn, prefix, maxsize=256, ttl=60):
+        self.conn = conn
+        self.prefix = prefix
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def version_key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get_or_set(self, key, loader):
+        """
+        Retrieve a value from the cache, calling `loader` to fill it on a
+        miss or when the value was cached under an older version
+
+        :param key: Key of the value
+        :param loader: Callable with no arguments that produces the value
+        :return: Cached or freshly loaded value
+        """
+        # The version is read before loading, so a value loaded while
+        # another process invalidates is cached under the old version
+        version = self.conn.get(self.version_key(key))
+        cached = self.local.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        value = loader()
+        self.local.set(key, (version, value))
+        return value
+
+    def invalidate(self, key):
+        self.conn.incr(self.version_key(key))
+        self.local.invalidate(key)
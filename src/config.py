@@ -12,6 +12,30 @@ class BaseConfig:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     GROUPME_TOKEN = os.getenv('GROUPME_TOKEN')
     BASE_URL = os.getenv('BASE_URL')
+    GROUPME_API_URL = os.getenv('GROUPME_API_URL', 'https://api.groupme.com/v3/')
+    GROUPME_IMAGE_URL = os.getenv('GROUPME_IMAGE_URL', 'https://image.groupme.com/')
+    BOT_LOAD_WORKERS = int(os.getenv('BOT_LOAD_WORKERS', 8))
+    GROUP_CACHE_TTL = int(os.getenv('GROUP_CACHE_TTL', 300))
+    GROUP_CACHE_SIZE = int(os.getenv('GROUP_CACHE_SIZE', 128))
+    COMMAND_CACHE_TTL = int(os.getenv('COMMAND_CACHE_TTL', 300))
+    INFO_CACHE_TTL = int(os.getenv('INFO_CACHE_TTL', 300))
+    COMMAND_USAGE_FLUSH_INTERVAL = int(os.getenv('COMMAND_USAGE_FLUSH_INTERVAL', 60))
+    IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+    IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', 2048))
+    GALLERY_REFRESH_INTERVAL = int(os.getenv('GALLERY_REFRESH_INTERVAL', 600))
+    GALLERY_PRUNE_INTERVAL = int(os.getenv('GALLERY_PRUNE_INTERVAL', 24 * 60 * 60))
+    BOT_POST_RATE = float(os.getenv('BOT_POST_RATE', 1))
+    BOT_POST_BURST = int(os.getenv('BOT_POST_BURST', 5))
+    BOT_POST_RETRIES = int(os.getenv('BOT_POST_RETRIES', 4))
+    COMMAND_JOB_TIMEOUT = int(os.getenv('COMMAND_JOB_TIMEOUT', 1000))
+    COMMAND_COALESCE_TTL = int(os.getenv('COMMAND_COALESCE_TTL', COMMAND_JOB_TIMEOUT))
+    BACKFILL_PAGE_SIZE = int(os.getenv('BACKFILL_PAGE_SIZE', 1000))
+    BACKFILL_TIME_BUDGET = int(os.getenv('BACKFILL_TIME_BUDGET', 600))
+    FLEET_REFRESH_WORKERS = int(os.getenv('FLEET_REFRESH_WORKERS', 4))
+    FLEET_API_BUDGET = int(os.getenv('FLEET_API_BUDGET', 5))
+    INGEST_INTERVAL = int(os.getenv('INGEST_INTERVAL', 60))
+    LIKE_REFRESH_WINDOW = int(os.getenv('LIKE_REFRESH_WINDOW', 3 * 60 * 60))
+    METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 10))
 
 
 class DevelopmentConfig(BaseConfig):
@@ -0,0 +1,103 @@
+import random
+
+from src import app, db, groupme, queues
+from src.models import GalleryImage
+from src.worker import conn
+
+RNG = random.SystemRandom()
+
+
+class IndexNotReady(Exception):
+    pass
+
+
+def indexed_key(group_id):
+    return f'gmbot:gallery:{group_id}:indexed'
+
+
+def refresh_gallery(group_id, prune=False):
+    """
+    Adds every gallery image newer than the newest indexed image to a
+    group's gallery index. Only the newest gallery pages are fetched once
+    the index exists, unless `prune` is set: then the whole gallery is
+    listed and images whose messages were deleted are dropped from the
+    index. Refreshes of a group are serialized so two of them never claim
+    the same positions.
+
+    :param group_id: Group ID of the gallery
+    :param prune: Drop the images of deleted messages, defaults to False
+    :return: Number of images added
+    """
+    with conn.lock(f'gmbot:gallery:{group_id}:lock',
+                   timeout=app.config['COMMAND_JOB_TIMEOUT']):
+        newest = GalleryImage.get_newest(group_id)
+        indexed = GalleryImage.get_message_ids(group_id) if prune else set()
+
+        group = groupme.get_group(group_id)
+        listed, new_images = set(), []
+        for message in group.gallery.list_all():
+            listed.add(message.id)
+            if message.id in indexed:
+                continue
+            # Stops at the first message already indexed rather than at the
+            # newest one, which may since have been deleted
+            if not prune and newest is not None and GalleryImage.is_indexed(group_id,
+                                                                            message.id):
+                break
+            for attachment in message.attachments:
+                if attachment.type == 'image':
+                    new_images.append((message.id, attachment.url))
+
+        removed = 0
+        if prune:
+            removed = GalleryImage.remove_messages(group_id, indexed - listed)
+            # Committed first so the renumbered positions are reloaded
+            db.session.commit()
+            newest = GalleryImage.get_newest(group_id)
+        next_position = newest.position + 1 if newest is not None else 0
+
+        # Gallery pages are newest first; index oldest first so the newest
+        # image always holds the highest position
+        for position, (message_id, url) in enumerate(reversed(new_images), next_position):
+            db.session.add(GalleryImage(group_id, position, message_id, url))
+        db.session.commit()
+        conn.set(indexed_key(group_id), 1)
+
+    app.logger.info(f'{len(new_images)} gallery images indexed and {removed} removed '
+                    f'for {group_id}')
+    return len(new_images)
+
+
+def schedule_refresh(group_id):
+    """
+    Enqueues a gallery refresh unless one ran within the last
+    GALLERY_REFRESH_INTERVAL seconds. Every GALLERY_PRUNE_INTERVAL seconds
+    the refresh also prunes deleted images.
+
+    :param group_id: Group ID of the gallery
+    """
+    key = f'gmbot:gallery:{group_id}'
+    if conn.set(key, 1, nx=True, ex=app.config['GALLERY_REFRESH_INTERVAL']):
+        prune = conn.set(key + ':prune', 1, nx=True, ex=app.config['GALLERY_PRUNE_INTERVAL'])
+        queues['low'].enqueue(refresh_gallery, group_id, bool(prune))
+
+
+def random_image(group_id):
+    """
+    Picks a uniformly random image from a group's gallery index. The index
+    is built and kept up to date in the worker.
+
+    :param group_id: Group ID of the gallery
+    :return: URL of the image or None if the gallery is empty
+    :raises IndexNotReady: If the group's index hasn't been built yet
+    """
+    schedule_refresh(group_id)
+    newest = GalleryImage.get_newest(group_id)
+    if newest is None:
+        if not conn.exists(indexed_key(group_id)):
+            raise IndexNotReady(group_id)
+        return None
+
+    # A prune may have renumbered the index since the newest image was read
+    image = GalleryImage.get_at(group_id, RNG.randint(0, newest.position))
+    return image.url if image is not None else None
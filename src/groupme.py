@@ -1,21 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytz
 import requests
 from groupy import attachments
 
-from src import app, bots, groupme_token, groupy_client
+from src import app, bots, groupme_token, groupy_client, metrics, names
+from src.cache import TTLCache
+
+group_cache = TTLCache(maxsize=app.config['GROUP_CACHE_SIZE'],
+                       ttl=app.config['GROUP_CACHE_TTL'])
 
 
 def get_bot(group_id):
     """
-    Looks through active GroupMeBots and returns the one that corresponds
-    to the group_id parameter
+    Returns the active GroupMeBot that corresponds to the group_id parameter
 
     :param group_id: group id of the GroupMeBot object
     :return: GroupMeBot object
     """
-    for bot in bots:
-        if bot.group_id == group_id:
-            return bot
+    return bots.get(group_id)
 
 
 def get_member(group_id, username=None, user_id=None):
@@ -24,82 +27,130 @@ def get_member(group_id, username=None, user_id=None):
     parameter. Must supply either a username or user id
 
     :param group_id: group id of the group to search in
-    :param username: username of the member to search for, defaults to None
+    :param username: username or @mention of the member to search for, matched
+                     apart from case and spacing, defaults to None
     ;param user_id: user id of the member to search for, defaults to None
     :return: Groupy Member object
     """
-    group_members = get_group(group_id).members
+    _, by_id = _load_group(group_id)
     if username:
-        for member in group_members:
-            if member.nickname.lower() == username.lower():
+        key = names.normalize(username)
+        for member in by_id.values():
+            if names.normalize(member.nickname) == key:
                 return member
     if user_id:
-        for member in group_members:
-            if member.user_id == user_id:
-                return member
+        return by_id.get(user_id)
+
+
+def get_members(group_id, user_ids):
+    """
+    Get many members of a group from a single group fetch
+
+    :param group_id: group id of the group to search in
+    :param user_ids: user ids of the members to search for
+    :return: dict of user id -> Groupy Member object, missing members are left out
+    """
+    _, by_id = _load_group(group_id)
+    return {user_id: by_id[user_id] for user_id in user_ids if user_id in by_id}
 
 
 def get_group(group_id):
     """
-    Retrieve a Groupy Group object by it's Group ID
+    Retrieve a Groupy Group object by it's Group ID. Groups are cached
+    in-process for GROUP_CACHE_TTL seconds.
 
     :return: Groupy Group object
     """
-    return groupy_client.groups.get(group_id)
+    group, _ = _load_group(group_id)
+    return group
+
+
+def cache_group(group):
+    """
+    Store an already fetched Groupy Group object in the group cache
+
+    :param group: Groupy Group object
+    :return: The cached (group, members by user id) tuple
+    """
+    by_id = {member.user_id: member for member in group.members}
+    cached = (group, by_id)
+    group_cache.set(group.group_id, cached)
+    return cached
+
+
+def invalidate_group(group_id):
+    """
+    Drop a group and its members from the group cache so the next lookup
+    goes to the GroupMe API
+
+    :param group_id: group id of the group to invalidate
+    """
+    group_cache.invalidate(group_id)
+
+
+def _load_group(group_id):
+    cached = group_cache.get(group_id)
+    if cached is None:
+        cached = cache_group(groupy_client.groups.get(group_id))
+    return cached
 
 
-def load_messages(bot, tstamp, new_messages=None, messages=None):
+def iter_messages(bot, tstamp=None, before_id=None):
     """
-    Loads all messages in a GroupMe group back until a certain timestamp
+    Streams the messages of a GroupMe group newest first, page by page,
+    back until a certain timestamp. The next page is fetched on a
+    background thread while the current page is being consumed.
 
     :param bot: The bot within the group being searched for messages
-    :param tstamp: Timestamp of the oldest message to search for
-    :param new_messages: List of new messages to be iterated over, defaults to None
-    :param messages: List of messages that have already been looked over, defaults to None
+    :param tstamp: Timestamp of the oldest message to yield, defaults to None (all messages)
+    :param before_id: Only yield messages older than this message id, defaults to None
 
-    :return: List of Groupy Message objects dating back to tstamp parameter
+    :return: Generator of Groupy Message objects dating back to tstamp parameter
     """
-    tstamp = tstamp.replace(tzinfo=pytz.UTC)
+    if tstamp is not None:
+        tstamp = tstamp.replace(tzinfo=pytz.UTC)
 
-    if new_messages is None:
-        new_messages = bot.group.messages.list()
-    if messages is None:
-        messages = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page = _message_page(bot, before_id)
+        while page:
+            next_page = executor.submit(_message_page, bot, page[-1].id)
+            for message in page:
+                if tstamp is not None and message.created_at.replace(tzinfo=pytz.UTC) <= tstamp:
+                    next_page.cancel()
+                    app.logger.info('All messages loaded')
+                    return
+                yield message
+            page = next_page.result()
 
-    for message in new_messages:
-        message_tstamp = message.created_at.replace(tzinfo=pytz.UTC)
-        if message_tstamp > tstamp:
-            messages.append(message)
-        else:
-            app.logger.info('All messages loaded')
-            return messages
 
-    new_messages = bot.group.messages.list_before(new_messages[-1].id)
-    return load_messages(bot, tstamp, new_messages, messages)
+def _message_page(bot, before_id=None):
+    if before_id is None:
+        return list(bot.group.messages.list())
+    return list(bot.group.messages.list_before(before_id))
 
 
 def api_call(path, method, params=None, payload=None):
-    url = f'https://api.groupme.com/v3/{path}'
+    url = app.config['GROUPME_API_URL'] + path
     if params:
         params['token'] = groupme_token
     else:
         params = {'token': groupme_token}
 
+    hooks = {'response': metrics.record_api_response}
     if method.lower() == 'get':
-        return requests.get(url=url, params=params, json=payload)
+        return requests.get(url=url, params=params, json=payload, hooks=hooks)
     elif method.lower() == 'post':
-        return requests.post(url=url, params=params, json=payload)
+        return requests.post(url=url, params=params, json=payload, hooks=hooks)
 
 
-def create_image_attachment(img_path):
+def create_image_attachment(data):
     """
     Create a Groupy image attachment object to send in a message.
 
-    :param img_path: Path to an image file
+    :param data: Contents of an image file
     :return: Groupy image attachment object
     """
-    url = 'https://image.groupme.com/pictures'
-    with open(img_path, 'rb') as f:
-        data = f.read()
-        r = requests.post(url, data=data, params={'token': groupme_token}).json()
-        return attachments.Image(r['payload']['url'])
+    url = app.config['GROUPME_IMAGE_URL'] + 'pictures'
+    r = requests.post(url, data=data, params={'token': groupme_token},
+                      hooks={'response': metrics.record_api_response}).json()
+    return attachments.Image(r['payload']['url'])
@@ -0,0 +1,180 @@
+import io
+
+import numpy as np
+import requests
+from PIL import Image
+
+from src import app
+
+
+class ImageError(Exception):
+    pass
+
+
+class ImageTooLarge(ImageError):
+    pass
+
+
+def fetch_image(url, max_bytes=None):
+    """
+    Downloads an image into memory, giving up once it exceeds `max_bytes`
+
+    :param url: URL of the image
+    :param max_bytes: Maximum download size, defaults to IMAGE_MAX_BYTES
+    :return: Image file contents as bytes
+    """
+    max_bytes = max_bytes or app.config['IMAGE_MAX_BYTES']
+    try:
+        response = requests.get(url, stream=True, timeout=10)
+        response.raise_for_status()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ImageError(str(e))
+
+    with response:
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ImageTooLarge(url)
+
+        data = io.BytesIO()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            data.write(chunk)
+            if data.tell() > max_bytes:
+                raise ImageTooLarge(url)
+    return data.getvalue()
+
+
+def open_image(data, max_side=None):
+    """
+    Decodes an image, letting the JPEG decoder downscale while decoding and
+    shrinking anything larger than `max_side` before it is filtered
+
+    :param data: Image file contents
+    :param max_side: Longest allowed side in pixels, defaults to IMAGE_MAX_SIDE
+    :return: RGB PIL Image
+    """
+    max_side = max_side or app.config['IMAGE_MAX_SIDE']
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft('RGB', (max_side, max_side))
+        # Image.open is lazy; decode here so truncated or corrupt files
+        # fail inside the try
+        img.load()
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+    except (IOError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ImageError(str(e))
+
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.BILINEAR)
+    return img
+
+
+# Two-color ramp used by the red overlay, black point -> white point
+OVERLAY_BLACK = np.array([254, 0, 2], dtype=np.float32)
+OVERLAY_WHITE = np.array([255, 255, 15], dtype=np.float32)
+
+# Values a channel can take after posterizing to 4 bits
+POSTERIZE_LEVELS = np.arange(0, 256, 16, dtype=np.float32)
+
+# 3x3 smoothing kernel used by PIL's ImageFilter.SMOOTH (center weight 5,
+# scale 13), which is what ImageEnhance.Sharpness blends away from
+SMOOTH_CENTER = 5
+SMOOTH_SCALE = 13
+
+
+def deepfry(img):
+    """
+    Turns any image into a terrible quality .jpeg image. PIL only does the
+    resampling; posterize, the red overlay, blend and sharpen run as NumPy
+    operations over a single buffer.
+
+    :param img: RGB PIL Image
+    :return: Deep fried PIL Image
+    """
+    # Absolutely devastate the image
+    width, height = img.width, img.height
+    img = img.resize((int(width ** .75), int(height ** .75)), resample=Image.LANCZOS)
+    img = img.resize((int(width ** .88), int(height ** .88)), resample=Image.BILINEAR)
+    img = img.resize((int(width ** .9), int(height ** .9)), resample=Image.BICUBIC)
+    img = img.resize((width, height), resample=Image.BICUBIC)
+
+    # Posterize to 4 bits per channel
+    pixels = np.asarray(img, dtype=np.uint8) & 0xF0
+    red = pixels[..., 0] >> 4
+
+    # After posterizing, every output pixel only depends on its own level
+    # and the red level of the same pixel, so the overlay and blend are a
+    # lookup into a 16x16 table per channel, indexed by (level << 4) | red
+    table = blend_table(int(red.mean() * 16 + 0.5))
+    pixels |= red[..., None]
+    for channel in range(3):
+        pixels[..., channel] = table[channel].take(pixels[..., channel])
+
+    return Image.fromarray(sharpen(pixels, 100), 'RGB')
+
+
+def blend_table(mean):
+    """
+    Builds the red/yellow overlay and 0.75 blend for every combination of
+    posterized channel level and red level
+
+    :param mean: Mean of the posterized red channel, used by the contrast step
+    :return: 3x256 uint8 array indexed by [channel, level * 16 + red level]
+    """
+    # Red overlay: contrast 2.0 around the channel mean, brightness 1.5,
+    # then map onto a red -> yellow ramp
+    red = np.clip(mean + (POSTERIZE_LEVELS - mean) * 2.0, 0, 255).astype(np.uint8)
+    red = np.clip(red * 1.5, 0, 255).astype(np.uint8)
+    overlay = OVERLAY_BLACK + np.floor(red[:, None] * (OVERLAY_WHITE - OVERLAY_BLACK) / 255)
+
+    # table[channel, level, red level]
+    table = np.trunc(POSTERIZE_LEVELS[None, :, None] * 0.25 + overlay.T[:, None, :] * 0.75)
+    return table.astype(np.uint8).reshape(3, 256)
+
+
+def sharpen(pixels, factor):
+    """
+    Extrapolates an image away from its smoothed version, the same way
+    ImageEnhance.Sharpness does. Border pixels are left untouched.
+
+    :param pixels: HxWx3 uint8 array
+    :param factor: Integer sharpness factor, 1 returns the original image
+    :return: HxWx3 uint8 array
+    """
+    # int16 holds the extrapolated values for factors up to 127
+    dtype = np.int16 if abs(factor) < 128 else np.int32
+    pixels = pixels.astype(dtype)
+    smooth = pixels.copy()
+    if pixels.shape[0] > 2 and pixels.shape[1] > 2:
+        rows = pixels[:-2] + pixels[1:-1]
+        rows += pixels[2:]
+        window = rows[:, :-2] + rows[:, 1:-1]
+        window += rows[:, 2:]
+        window += pixels[1:-1, 1:-1] * (SMOOTH_CENTER - 1)
+        # Rounded division, like the smoothing filter
+        window *= 2
+        window += SMOOTH_SCALE
+        window //= 2 * SMOOTH_SCALE
+        smooth[1:-1, 1:-1] = window
+
+    pixels -= smooth
+    pixels *= factor
+    pixels += smooth
+    np.clip(pixels, 0, 255, out=pixels)
+    return pixels.astype(np.uint8)
+
+
+def encode_jpeg(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def jpegify(url):
+    """
+    Downloads, deep fries and re-encodes an image entirely in memory
+
+    :param url: URL of the image
+    :return: JPEG file contents as bytes
+    """
+    return encode_jpeg(deepfry(open_image(fetch_image(url))))
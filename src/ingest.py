@@ -0,0 +1,169 @@
+import time
+from datetime import datetime, timedelta
+
+from src import app, db, groupme, loader, queues
+from src import stats as group_stats
+from src.models import Message, StatBucket
+from src.worker import conn
+
+
+def ingest_lock(group_id):
+    """
+    Redis lock held while a group's messages and time buckets are written,
+    so two ingests never store the same messages past the same high-water
+    mark
+
+    :param group_id: Group ID of the group
+    :return: redis Lock object
+    """
+    return conn.lock(f'gmbot:ingest:{group_id}:lock', timeout=app.config['COMMAND_JOB_TIMEOUT'])
+
+
+def ingest_messages(bot, since=None):
+    """
+    Stores every message of a group newer than the stored high-water mark.
+    If nothing has been stored for the group yet, messages are loaded back
+    until `since` (or the beginning of the group if `since` is None).
+
+    :param bot: The bot within the group to ingest messages from
+    :param since: Oldest message timestamp to load on a first ingest, defaults to None
+    :return: Number of messages stored
+    """
+    with ingest_lock(bot.group_id):
+        stored = _ingest(bot, since)
+        group_stats.compact_buckets(bot.group_id)
+        db.session.commit()
+    return stored
+
+
+def schedule_ingest(group_id):
+    """
+    Enqueues an ingest of a group's new messages at most once every
+    INGEST_INTERVAL seconds. Called for every message GroupMe delivers, so
+    the time buckets stay current between !summary runs.
+
+    :param group_id: Group ID of the group that received a message
+    """
+    interval = app.config['INGEST_INTERVAL']
+    if conn.set(f'gmbot:ingest:{group_id}', 1, nx=True, ex=interval):
+        queues['low'].enqueue(ingest_new, group_id, timeout=app.config['COMMAND_JOB_TIMEOUT'])
+
+
+def ingest_new(group_id):
+    """
+    Stores a group's new messages and corrects the likes of the messages
+    from the last LIKE_REFRESH_WINDOW seconds. Runs in the worker.
+
+    :param group_id: Group ID of the group to ingest
+    """
+    bot = groupme.get_bot(group_id)
+    if bot is None:
+        # Work horses start with an empty registry
+        loader.warm_start()
+        bot = groupme.get_bot(group_id)
+    # Groups without stored messages get their history loaded by the
+    # first !summary or !stats instead
+    if bot is None or Message.get_latest(group_id) is None:
+        return
+
+    since = datetime.utcnow() - timedelta(seconds=app.config['LIKE_REFRESH_WINDOW'])
+    with ingest_lock(group_id):
+        _ingest(bot)
+        _refresh_likes(bot, since)
+
+
+def _ingest(bot, since=None):
+    latest = Message.get_latest(bot.group_id)
+
+    if latest is not None:
+        new_messages = bot.group.messages.list_all_after(latest.id)
+    else:
+        new_messages = groupme.iter_messages(bot, since)
+
+    stored, _ = _store(bot.group_id, new_messages)
+    return stored
+
+
+def _refresh_likes(bot, since):
+    # Likes keep arriving after a message was stored, so the likes of the
+    # messages newer than `since` are re-read from GroupMe and the stored
+    # messages and their time buckets corrected where they changed
+    now = datetime.utcnow()
+    stored = {message.id: message for message in Message.get_messages(bot.group_id, since)}
+    # Bring the buckets to the resolutions bucket_resolution expects
+    group_stats.compact_buckets(bot.group_id, now)
+
+    deltas, changed = {}, 0
+    for message in groupme.iter_messages(bot, since):
+        db_message = stored.get(message.id)
+        if db_message is None or set(db_message.favorited_by) == set(message.favorited_by):
+            continue
+
+        resolution = group_stats.bucket_resolution(db_message.created_at, now)
+        delta = deltas.setdefault(resolution, {})
+        for key, count in group_stats.bucket_counts([db_message], resolution).items():
+            merged = delta.setdefault(key, group_stats.empty_bucket())
+            for field in merged:
+                merged[field] -= count[field]
+
+        db_message.favorited_by = list(message.favorited_by)
+        db_message.like_count = len(db_message.favorited_by)
+        for key, count in group_stats.bucket_counts([db_message], resolution).items():
+            merged = delta.setdefault(key, group_stats.empty_bucket())
+            for field in merged:
+                merged[field] += count[field]
+        changed += 1
+
+    for resolution, counts in deltas.items():
+        StatBucket.add_counts(bot.group_id, resolution, counts)
+    db.session.commit()
+    app.logger.info(f'Likes changed on {changed} messages in {bot.group_id}')
+    return changed
+
+
+def backfill_messages(bot, deadline=None):
+    """
+    Stores the messages of a group older than the oldest stored message,
+    committing a batch at a time, back to the beginning of the group or
+    until `deadline` passes. Since every batch is committed, an interrupted
+    backfill picks up where it left off on the next call.
+
+    :param bot: The bot within the group to backfill messages from
+    :param deadline: time.time() value to stop after, defaults to None (no limit)
+    :return: True if the beginning of the group was reached
+    """
+    oldest = Message.get_oldest(bot.group_id)
+    before_id = oldest.id if oldest is not None else None
+
+    messages = groupme.iter_messages(bot, before_id=before_id)
+    try:
+        _, complete = _store(bot.group_id, messages, deadline=deadline)
+    finally:
+        messages.close()
+    return complete
+
+
+def _store(group_id, messages, batch_size=500, deadline=None):
+    count = 0
+    batch = []
+    for message in messages:
+        batch.append(Message(message))
+        if len(batch) == batch_size:
+            count += _commit(group_id, batch)
+            batch = []
+            if deadline is not None and time.time() >= deadline:
+                app.logger.info(f'{count} messages ingested, stopped at deadline')
+                return count, False
+    count += _commit(group_id, batch)
+    app.logger.info(f'{count} messages ingested')
+    return count, True
+
+
+def _commit(group_id, batch):
+    # Messages and their time bucket counters are committed together so
+    # the buckets never count a message twice or miss one
+    db.session.add_all(batch)
+    resolution = group_stats.BUCKET_LEVELS[0][0]
+    StatBucket.add_counts(group_id, resolution, group_stats.bucket_counts(batch, resolution))
+    db.session.commit()
+    return len(batch)
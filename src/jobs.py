@@ -0,0 +1,162 @@
+import hashlib
+import json
+import uuid
+
+from groupy import attachments
+
+from src import app, queues, strings
+from src.bot.groupmebot import GroupMeBot
+from src.worker import conn
+
+# Claims the pending slot for a (group, command) or, if a job already holds
+# it, adds the requester to that job's waiters. Done in one script so a job
+# starting in between can't drop a waiter.
+CLAIM_SCRIPT = conn.register_script("""
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+redis.call('rpush', KEYS[2], ARGV[3])
+redis.call('expire', KEYS[2], ARGV[2])
+return 0
+""")
+
+# Re-claims the pending slot for a command that has more work to do and
+# hands the waiters on, either to the continuation or, if another job
+# already holds the slot, to that job
+CONTINUE_SCRIPT = conn.register_script("""
+local claimed = redis.call('set', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2])
+for i = 3, #ARGV do
+    redis.call('rpush', KEYS[2], ARGV[i])
+end
+redis.call('expire', KEYS[2], ARGV[2])
+if claimed then
+    return 1
+end
+return 0
+""")
+
+# Returned by a queued command whose work isn't finished; run_command
+# enqueues it again under the same pending key
+CONTINUE = 'continue'
+
+
+def pending_key(group_id, command_name, message=None):
+    key = f'gmbot:pending:{group_id}:{command_name}'
+    if message:
+        key += ':' + hashlib.sha1(message.lower().encode()).hexdigest()[:16]
+    return key
+
+
+def enqueue_command(command_obj, ctx):
+    """
+    Enqueues a queued command on its priority queue. If the same command
+    with the same arguments is already waiting to run for the group, no new
+    job is enqueued and the requester is mentioned once that job is done.
+
+    :param command_obj: Command object of the command
+    :param ctx: CommandContext of the request
+    :return: RQ Job object, or None if the request was coalesced
+    """
+    key = pending_key(ctx.group_id, command_obj.name, ctx.message)
+    job_id = str(uuid.uuid4())
+    waiter = json.dumps({'user_id': ctx.sender.user_id, 'nickname': ctx.sender.nickname}
+                        if ctx.sender is not None else None)
+    claimed = CLAIM_SCRIPT(keys=[key, key + ':waiters'],
+                           args=[job_id, app.config['COMMAND_COALESCE_TTL'], waiter])
+
+    if not claimed:
+        app.logger.info(f'!{command_obj.name} for {ctx.group_id} coalesced into a pending job')
+        ctx.bot.send(strings.queue.merged.format(command_obj.name))
+        return None
+
+    return _enqueue(command_obj, ctx, key, job_id)
+
+
+def continue_command(command_obj, ctx, key, waiters):
+    """
+    Enqueues the next run of a queued command that returned CONTINUE. The
+    waiters are carried over and only mentioned once a run finishes.
+
+    :param command_obj: Command object of the command
+    :param ctx: CommandContext of the request
+    :param key: Pending key the command was enqueued under
+    :param waiters: List of {'user_id', 'nickname'} dicts
+    :return: RQ Job object, or None if a job already holds the pending key
+    """
+    job_id = str(uuid.uuid4())
+    claimed = CONTINUE_SCRIPT(keys=[key, key + ':waiters'],
+                              args=[job_id, app.config['COMMAND_COALESCE_TTL'],
+                                    *map(json.dumps, waiters)])
+    if not claimed:
+        app.logger.info(f'!{command_obj.name} for {ctx.group_id} handed on to a pending job')
+        return None
+    return _enqueue(command_obj, ctx, key, job_id)
+
+
+def _enqueue(command_obj, ctx, key, job_id):
+    try:
+        return queues[command_obj.priority].enqueue(
+            run_command, command_obj.name, ctx, key,
+            timeout=app.config['COMMAND_JOB_TIMEOUT'], job_id=job_id)
+    except Exception:
+        conn.delete(key)
+        raise
+
+
+def run_command(command_name, ctx, key):
+    """
+    Runs a queued command in the worker. The pending slot is released as
+    the job starts, so requests made while it runs get a fresh job that
+    sees their messages. Coalesced requesters are mentioned once the
+    command succeeds or fails; a command that returns CONTINUE is
+    enqueued again and keeps them waiting.
+
+    :param command_name: Name of the command
+    :param ctx: CommandContext of the first request
+    :param key: Pending key the job was enqueued under
+    """
+    pipe = conn.pipeline()
+    pipe.lrange(key + ':waiters', 0, -1)
+    pipe.delete(key, key + ':waiters')
+    raw_waiters, _ = pipe.execute()
+
+    waiters = [waiter for waiter in map(json.loads, raw_waiters) if waiter]
+    command_obj = GroupMeBot.commands[command_name]
+    try:
+        result = command_obj.command(ctx)
+    except Exception:
+        notify_waiters(ctx.bot, command_name, waiters, failed=True)
+        raise
+
+    if result == CONTINUE:
+        continue_command(command_obj, ctx, key, waiters)
+    else:
+        notify_waiters(ctx.bot, command_name, waiters)
+
+
+def notify_waiters(bot, command_name, waiters, failed=False):
+    """
+    Mentions everyone whose request was coalesced into a finished job. A
+    failed send is logged rather than raised so it can't mask the result
+    of the command.
+
+    :param bot: GroupMeBot of the group
+    :param command_name: Name of the command
+    :param waiters: List of {'user_id', 'nickname'} dicts
+    :param failed: True if the command raised, defaults to False
+    """
+    unique = list({waiter['user_id']: waiter for waiter in waiters}.values())
+    if not unique:
+        return
+
+    text, loci = '', []
+    for waiter in unique:
+        loci.append([len(text), len(waiter['nickname']) + 1])
+        text += f'@{waiter["nickname"]} '
+    text += (strings.queue.failed if failed else strings.queue.done).format(command_name)
+
+    mentions = attachments.Mentions(loci=loci, user_ids=[w['user_id'] for w in unique])
+    try:
+        bot.send(text, attachments=[mentions])
+    except Exception:
+        app.logger.exception(f'Could not notify waiters of !{command_name} in {bot.group_id}')
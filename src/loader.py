@@ -0,0 +1,90 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from groupy.api.bots import Bot
+from groupy.api.groups import Group
+
+from src import app, bots, groupy_client
+from src.bot import GroupMeBot
+from src.worker import conn
+
+SNAPSHOT_KEY = 'gmbot:bots'
+
+
+def load_bots(background=False):
+    """
+    Loads all bots with a callback to this app into the bot registry
+    accessible to the rest of the application. Bots from the last saved
+    snapshot are registered straight away; the GroupMe API refresh runs
+    on a background thread when `background` is True.
+
+    :param background: Refresh from the API without blocking, defaults to False
+    :return: The bot registry
+    """
+    warm_start()
+
+    if background:
+        threading.Thread(target=refresh_bots, name='load-bots', daemon=True).start()
+    else:
+        refresh_bots()
+    return bots
+
+
+def refresh_bots():
+    """
+    Fetches every bot, its group and the bot owner from the GroupMe API,
+    loading the groups in parallel, then saves a new snapshot. Bots that
+    no longer exist or point elsewhere are dropped from the registry.
+    """
+    started = time.time()
+    callback_url = app.config['BASE_URL'] + '/callback'
+    me = groupy_client.user.get_me()
+    active = [bot for bot in groupy_client.bots.list() if bot.callback_url == callback_url]
+
+    def load(bot):
+        group = groupy_client.groups.get(bot.group_id)
+        return GroupMeBot(bot.bot_id, bot=bot, group=group, me=me)
+
+    with ThreadPoolExecutor(max_workers=app.config['BOT_LOAD_WORKERS']) as executor:
+        for bot in executor.map(load, active):
+            bots.add(bot)
+            app.logger.info(f'{bot.group.name} loaded...')
+
+    active_ids = {bot.bot_id for bot in active}
+    for bot in list(bots):
+        if bot.bot_id not in active_ids:
+            bots.remove(bot)
+            app.logger.info(f'Bot {bot.bot_id} of group {bot.group_id} removed')
+
+    save_snapshot(me)
+    app.logger.info(f'{len(active)} bots loaded in {time.time() - started:.2f}s')
+
+
+def warm_start():
+    """
+    Registers bots from the saved snapshot without calling the GroupMe API
+
+    :return: Number of bots registered
+    """
+    raw = conn.get(SNAPSHOT_KEY)
+    if raw is None:
+        return 0
+
+    snapshot = json.loads(raw.decode())
+    for entry in snapshot['bots']:
+        bot = Bot(groupy_client.bots, **entry['bot'])
+        group = Group(groupy_client.groups, **entry['group'])
+        bots.add(GroupMeBot(bot.bot_id, bot=bot, group=group, me=snapshot['me']))
+
+    app.logger.info(f'{len(snapshot["bots"])} bots loaded from snapshot')
+    return len(snapshot['bots'])
+
+
+def save_snapshot(me):
+    snapshot = {
+        'me': me,
+        'bots': [{'bot': bot.bot.data, 'group': bot.group.data} for bot in bots],
+    }
+    conn.set(SNAPSHOT_KEY, json.dumps(snapshot))
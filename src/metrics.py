@@ -0,0 +1,258 @@
+import atexit
+import functools
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import redis
+import rq
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src import app, groupy_client
+from src.worker import conn, listen
+
+REDIS_KEY = 'gmbot:metrics'
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# name -> (type, help)
+METRICS = {
+    'gmbot_command_duration_seconds': ('histogram', 'Time spent running a built-in command'),
+    'gmbot_command_db_queries': ('histogram', 'Database queries made by one built-in command'),
+    'gmbot_commands_total': ('counter', 'Built-in commands run, by outcome'),
+    'gmbot_api_request_duration_seconds': ('histogram', 'GroupMe API response time by endpoint'),
+    'gmbot_api_requests_total': ('counter', 'GroupMe API requests by endpoint and status'),
+    'gmbot_http_request_duration_seconds': ('histogram', 'Time spent handling a web request'),
+    'gmbot_http_request_db_queries': ('histogram', 'Database queries made by one web request'),
+    'gmbot_db_queries_total': ('counter', 'Database queries executed'),
+    'gmbot_queue_depth': ('gauge', 'Jobs waiting in each RQ queue'),
+}
+
+# Observations are buffered per process and added onto the shared Redis
+# hash at most every METRICS_FLUSH_INTERVAL seconds, so web and worker
+# processes all report into the same totals.
+_buffer = Counter()
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+_local = threading.local()
+
+
+def inc(name, value=1, **labels):
+    """
+    Adds `value` to a counter
+
+    :param name: Metric name
+    :param value: Amount to add, defaults to 1
+    :param labels: Label values of the sample
+    """
+    _add([(_sample(name, labels), value)])
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """
+    Records one observation in a histogram
+
+    :param name: Metric name
+    :param value: Observed value
+    :param buckets: Upper bounds of the histogram buckets, defaults to LATENCY_BUCKETS
+    :param labels: Label values of the sample
+    """
+    samples = [(_sample(name + '_bucket', dict(labels, le=_format(bound))), int(value <= bound))
+               for bound in buckets]
+    samples.append((_sample(name + '_bucket', dict(labels, le='+Inf')), 1))
+    samples.append((_sample(name + '_sum', labels), value))
+    samples.append((_sample(name + '_count', labels), 1))
+    _add(samples)
+
+
+def _sample(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+def _add(samples):
+    with _buffer_lock:
+        for key, value in samples:
+            _buffer[key] += value
+        due = time.monotonic() - _last_flush >= app.config['METRICS_FLUSH_INTERVAL']
+
+    if due:
+        flush()
+
+
+def flush():
+    """
+    Adds every buffered observation onto the shared totals in Redis
+    """
+    global _last_flush
+
+    with _buffer_lock:
+        pending = dict(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+
+    if not pending:
+        return
+
+    try:
+        pipe = conn.pipeline(transaction=False)
+        for key, value in pending.items():
+            pipe.hincrbyfloat(REDIS_KEY, key, value)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        app.logger.warning(f'Could not flush metrics: {e}')
+        with _buffer_lock:
+            _buffer.update(pending)
+
+
+atexit.register(flush)
+
+
+def queries():
+    """
+    Returns the number of database queries made so far on this thread
+    """
+    return getattr(_local, 'queries', 0)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(*args):
+    _local.queries = queries() + 1
+    inc('gmbot_db_queries_total')
+
+
+def timed_command(name, func):
+    """
+    Wraps a built-in command so each run records its duration, outcome and
+    query count. The wrapper keeps the command's name, so queued commands
+    are instrumented in the worker too.
+
+    :param name: Name of the command
+    :param func: Function implementing the command
+    :return: Wrapped function
+    """
+    @functools.wraps(func)
+    def wrapper(ctx):
+        started, queries_before = time.perf_counter(), queries()
+        status = 'error'
+        try:
+            result = func(ctx)
+            status = 'ok'
+            return result
+        finally:
+            observe('gmbot_command_duration_seconds', time.perf_counter() - started,
+                    command=name)
+            observe('gmbot_command_db_queries', queries() - queries_before,
+                    buckets=QUERY_BUCKETS, command=name)
+            inc('gmbot_commands_total', command=name, status=status)
+    return wrapper
+
+
+def endpoint_name(url):
+    """
+    Reduces a GroupMe API URL to its endpoint, with ids replaced by :id,
+    e.g. groups/:id/messages
+
+    :param url: Request URL
+    :return: Endpoint name
+    """
+    path = urlsplit(url).path.strip('/')
+    if path.startswith('v3/'):
+        path = path[3:]
+    return '/'.join(':id' if re.search(r'\d', part) else part
+                    for part in path.split('/'))
+
+
+def record_api_response(response, *args, **kwargs):
+    """
+    requests response hook recording GroupMe API call counts and latency
+    """
+    endpoint = endpoint_name(response.url)
+    method = response.request.method
+    observe('gmbot_api_request_duration_seconds', response.elapsed.total_seconds(),
+            endpoint=endpoint, method=method)
+    inc('gmbot_api_requests_total', endpoint=endpoint, method=method,
+        status=str(response.status_code))
+
+
+groupy_client.session.hooks['response'].append(record_api_response)
+
+
+@app.before_request
+def start_request():
+    _local.request_started = time.perf_counter()
+    _local.request_queries = queries()
+
+
+@app.after_request
+def finish_request(response):
+    endpoint = request.endpoint or 'unknown'
+    observe('gmbot_http_request_duration_seconds',
+            time.perf_counter() - _local.request_started, endpoint=endpoint)
+    observe('gmbot_http_request_db_queries', queries() - _local.request_queries,
+            buckets=QUERY_BUCKETS, endpoint=endpoint)
+    return response
+
+
+def render():
+    """
+    Renders the shared totals and current queue depths in the Prometheus
+    text exposition format
+
+    :return: str
+    """
+    flush()
+    samples = [(json.loads(key), float(value))
+               for key, value in conn.hgetall(REDIS_KEY).items()]
+    for queue in listen:
+        samples.append((['gmbot_queue_depth', [['queue', queue]]],
+                        rq.Queue(queue, connection=conn).count))
+
+    families = {}
+    for (name, labels), value in samples:
+        families.setdefault(_family(name), []).append((name, labels, value))
+
+    lines = []
+    for family in sorted(families):
+        kind, help_text = METRICS[family]
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, labels, value in sorted(families[family], key=_sort_key):
+            lines.append(f'{name}{_labels(labels)} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _family(name):
+    if name in METRICS:
+        return name
+    return name.rsplit('_', 1)[0]
+
+
+def _sort_key(sample):
+    name, labels, _ = sample
+    bound = dict(labels).get('le')
+    others = [pair for pair in labels if pair[0] != 'le']
+    return others, name, float('inf') if bound == '+Inf' else float(bound or 0)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format(value):
+    if isinstance(value, float) and not math.isinf(value) and value.is_integer():
+        return str(int(value))
+    return repr(value)
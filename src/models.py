@@ -1,4 +1,8 @@
-from src import db
+import hashlib
+import json
+from datetime import datetime
+
+from src import db, names
 
 
 class Group(db.Model):
@@ -13,6 +17,7 @@ class Group(db.Model):
     ml_likes = db.Column(db.Integer)
     date_created = db.Column(db.DateTime)
     last_updated = db.Column(db.DateTime)
+    roster_hash = db.Column(db.String(40))
 
     def __init__(self, group):
         self.group_id = group.group_id
@@ -49,10 +54,19 @@ class Group(db.Model):
 
 class Member(db.Model):
     __tablename__ = 'members'
+    __table_args__ = (
+        db.Index('uq_members_group_user', 'group_id', 'user_id', unique=True),
+        db.Index('ix_members_group_mod', 'group_id', 'is_mod'),
+        db.Index('ix_members_group_ignored', 'group_id', 'is_ignored'),
+        # pattern ops so Postgres can also use the index for prefix LIKEs
+        db.Index('ix_members_group_username', 'group_id', 'username_key',
+                 postgresql_ops={'username_key': 'varchar_pattern_ops'}),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(20))
     group_id = db.Column(db.String(20))
     username = db.Column(db.String(100))
+    username_key = db.Column(db.String(100))
     avatar_url = db.Column(db.String(500))
     message_count = db.Column(db.Integer)
     like_count = db.Column(db.Integer)
@@ -62,8 +76,9 @@ class Member(db.Model):
 
     def __init__(self, member, group_id):
         self.user_id = member.user_id
-        self.group_id = member.group_id
+        self.group_id = group_id
         self.username = member.nickname
+        self.username_key = names.normalize(member.nickname)
         self.avatar_url = member.image_url
         self.message_count = 0
         self.like_count = 0
@@ -90,15 +105,34 @@ class Member(db.Model):
 
         :param group_id: Group ID of the member
         :param user_id: User ID of the member, defaults to None
-        :param username: Username of the member, defaults to None
+        :param username: Username or @mention of the member, matched exactly
+                         apart from case and spacing, defaults to None
         :return: Member database entry
         """
         if user_id:
             return cls.query.filter_by(group_id=group_id, user_id=user_id).first()
         if username:
-            for member in cls.get_members(group_id):
-                if member.username.lower() == username.lower():
-                    return member
+            return cls.query.filter_by(group_id=group_id,
+                                       username_key=names.normalize(username)).first()
+
+    @classmethod
+    def match_prefix(cls, group_id, prefix):
+        """
+        Retrieve the only Member entry whose username starts with `prefix`
+
+        :param group_id: Group ID of the member
+        :param prefix: Start of the username, or of an @mention
+        :return: Member database entry, or None if no member or more than one matches
+        """
+        key = names.normalize(prefix)
+        if not key:
+            return None
+        matches = cls.query.filter(
+            cls.group_id == group_id,
+            cls.username_key.like(names.escape_like(key) + '%', escape='\\')
+        ).limit(2).all()
+        if len(matches) == 1:
+            return matches[0]
 
     @classmethod
     def get_ignored(cls, group_id):
@@ -135,28 +169,102 @@ class Member(db.Model):
     @classmethod
     def save_new_members(cls, bot):
         """
-        Saves/updates new members into the database
+        Saves/updates new members into the database. Nothing is written if
+        the group's roster is unchanged since the last sync.
 
         :param bot: GroupMeBot object from the group of which to save members
+        :return: Number of member rows inserted or updated
         """
-        existing = [member.user_id for member in cls.get_members(bot.group_id)]
-
         bot.refresh()
+        fingerprint = cls.roster_fingerprint(bot.members)
+        db_group = Group.get_group(bot.group_id)
+        if db_group is not None and db_group.roster_hash == fingerprint:
+            return 0
+
+        existing = {member.user_id: member for member in cls.get_members(bot.group_id)}
+        new_members, mappings = [], []
         for member in bot.members:
-            if member.user_id not in existing:
-                cls.create_member(member, bot.group_id)
-            else:
-                db_member = Member.get_member(bot.group_id, user_id=member.user_id)
-                db_member.update(member)
+            db_member = existing.get(member.user_id)
+            if db_member is None:
+                new_members.append(cls(member, bot.group_id))
+            elif ((db_member.username, db_member.username_key, db_member.avatar_url) !=
+                  (member.nickname, names.normalize(member.nickname), member.image_url)):
+                mappings.append({
+                    'id': db_member.id,
+                    'username': member.nickname,
+                    'username_key': names.normalize(member.nickname),
+                    'avatar_url': member.image_url,
+                })
+
+        db.session.add_all(new_members)
+        db.session.bulk_update_mappings(cls, mappings)
+        if db_group is not None:
+            db_group.roster_hash = fingerprint
         db.session.commit()
+        return len(new_members) + len(mappings)
+
+    @staticmethod
+    def roster_fingerprint(members):
+        """
+        Hashes the ids, nicknames and avatars of a group's members
+
+        :param members: List of GroupMe member objects
+        :return: Hex digest
+        """
+        roster = sorted((member.user_id, member.nickname, member.image_url or '')
+                        for member in members)
+        return hashlib.sha1(json.dumps(roster).encode()).hexdigest()
+
+    @classmethod
+    def add_counts(cls, members, counts):
+        """
+        Adds tallied message/like counts onto members in one bulk update
+
+        :param members: Dict of Member entries keyed by user id
+        :param counts: Dict of count dicts keyed by user id, see stats.tally
+        :return: Number of member rows updated
+        """
+        mappings = []
+        for user_id, count in counts.items():
+            member = members[user_id]
+            mappings.append({
+                'id': member.id,
+                'message_count': member.message_count + count['message_count'],
+                'like_count': member.like_count + count['like_count'],
+                'likes_given': member.likes_given + count['likes_given'],
+            })
+
+        db.session.bulk_update_mappings(cls, mappings)
+        return len(mappings)
+
+    @classmethod
+    def set_counts(cls, members, counts):
+        """
+        Replaces the message/like counts of members in one bulk update.
+        Members without an entry in `counts` are set to zero.
+
+        :param members: Dict of Member entries keyed by user id
+        :param counts: Dict of count dicts keyed by user id, see stats.tally
+        :return: Number of member rows updated
+        """
+        empty = {'message_count': 0, 'like_count': 0, 'likes_given': 0}
+        mappings = [dict(counts.get(user_id, empty), id=member.id)
+                    for user_id, member in members.items()]
+
+        db.session.bulk_update_mappings(cls, mappings)
+        return len(mappings)
 
     def update(self, member):
         self.username = member.nickname
+        self.username_key = names.normalize(member.nickname)
         self.avatar_url = member.image_url
 
 
 class Command(db.Model):
     __tablename__ = 'commands'
+    __table_args__ = (
+        db.Index('uq_commands_group_command', 'group_id', 'command', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     command = db.Column(db.String(120))
     response = db.Column(db.String(1000))
@@ -198,9 +306,9 @@ class Reminder(db.Model):
     __tablename__ = 'reminders'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(50))
-    group_id = db.Column(db.String(50))
+    group_id = db.Column(db.String(50), index=True)
     message = db.Column(db.String(1000))
-    remind_time = db.Column(db.DateTime)
+    remind_time = db.Column(db.DateTime, index=True)
 
     def __init__(self, user_id, group_id, message, remind_time):
         self.user_id = user_id
@@ -217,3 +325,441 @@ class Reminder(db.Model):
         :return: List of Reminder objects
         """
         return cls.query.filter_by(group_id=group_id).all()
+
+    @classmethod
+    def get_due(cls, now):
+        """
+        Retrieve all Reminder objects that are due, across every group
+
+        :param now: Current time to compare reminder times against
+        :return: List of Reminder objects, earliest first
+        """
+        return cls.query.filter(cls.remind_time <= now) \
+            .order_by(cls.remind_time.asc()).all()
+
+    @classmethod
+    def get_upcoming(cls, now):
+        """
+        Retrieve the due times of all reminders that haven't fired yet
+
+        :param now: Current time to compare reminder times against
+        :return: List of (remind_time, id) tuples
+        """
+        return db.session.query(cls.remind_time, cls.id) \
+            .filter(cls.remind_time > now).all()
+
+
+class Message(db.Model):
+    __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_group_created', 'group_id', 'created_at'),
+    )
+    id = db.Column(db.String(30), primary_key=True)
+    group_id = db.Column(db.String(20))
+    user_id = db.Column(db.String(20))
+    name = db.Column(db.String(100))
+    sender_type = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    text = db.Column(db.Text)
+    favorited_by = db.Column(db.PickleType)
+    like_count = db.Column(db.Integer, default=0)
+    attachments = db.Column(db.PickleType)
+
+    def __init__(self, message):
+        self.id = message.id
+        self.group_id = message.group_id
+        self.user_id = message.user_id
+        self.name = message.name
+        self.sender_type = message.data.get('sender_type')
+        # Stored as naive UTC like the rest of the timestamps, so bucket
+        # counts can be taken from freshly built rows
+        self.created_at = message.created_at.replace(tzinfo=None)
+        self.text = message.text
+        self.favorited_by = list(message.favorited_by)
+        self.like_count = len(self.favorited_by)
+        self.attachments = [attachment.to_json() for attachment in message.attachments]
+
+    @classmethod
+    def get_messages(cls, group_id, after=None):
+        """
+        Retrieve stored messages from a group, newest first
+
+        :param group_id: Group ID of the messages
+        :param after: Only return messages created after this datetime, defaults to None
+        :return: List of Message objects
+        """
+        query = cls.query.filter_by(group_id=group_id)
+        if after is not None:
+            query = query.filter(cls.created_at > after)
+        return query.order_by(cls.created_at.desc()).all()
+
+    @classmethod
+    def stream_messages(cls, group_id, after=None, batch_size=1000):
+        """
+        Iterate over stored messages from a group, newest first, loading
+        `batch_size` rows at a time instead of the whole result
+
+        :param group_id: Group ID of the messages
+        :param after: Only return messages created after this datetime, defaults to None
+        :param batch_size: Number of rows fetched per round trip, defaults to 1000
+        :return: Iterator of Message objects
+        """
+        query = cls.query.filter_by(group_id=group_id)
+        if after is not None:
+            query = query.filter(cls.created_at > after)
+        return query.order_by(cls.created_at.desc()).yield_per(batch_size)
+
+    @classmethod
+    def get_page(cls, group_id, after=None, limit=1000):
+        """
+        Retrieve a page of stored messages from a group, oldest first,
+        starting after a (created_at, id) position
+
+        :param group_id: Group ID of the messages
+        :param after: Tuple of (created_at, id) of the last message of the previous
+                      page, defaults to None (the oldest message)
+        :param limit: Maximum number of messages, defaults to 1000
+        :return: List of Message objects
+        """
+        query = cls.query.filter_by(group_id=group_id)
+        if after is not None:
+            created_at, message_id = after
+            query = query.filter(db.or_(
+                cls.created_at > created_at,
+                db.and_(cls.created_at == created_at, cls.id > message_id)))
+        return query.order_by(cls.created_at.asc(), cls.id.asc()).limit(limit).all()
+
+    @classmethod
+    def get_most_liked(cls, group_id, after):
+        """
+        Retrieve the stored message with the most likes in a time window
+
+        :param group_id: Group ID of the message
+        :param after: Only consider messages created after this datetime
+        :return: Message object or None
+        """
+        return cls.query.filter(cls.group_id == group_id, cls.created_at > after) \
+            .order_by(cls.like_count.desc()).first()
+
+    @classmethod
+    def get_latest(cls, group_id):
+        """
+        Retrieve the newest stored message of a group (the ingestion
+        high-water mark)
+
+        :param group_id: Group ID of the message
+        :return: Message object or None
+        """
+        return cls.query.filter_by(group_id=group_id) \
+            .order_by(cls.created_at.desc()).first()
+
+    @classmethod
+    def get_oldest(cls, group_id):
+        """
+        Retrieve the oldest stored message of a group
+
+        :param group_id: Group ID of the message
+        :return: Message object or None
+        """
+        return cls.query.filter_by(group_id=group_id) \
+            .order_by(cls.created_at.asc()).first()
+
+
+class GalleryImage(db.Model):
+    __tablename__ = 'gallery_images'
+    __table_args__ = (
+        db.Index('uq_gallery_group_position', 'group_id', 'position', unique=True),
+        db.Index('ix_gallery_group_message', 'group_id', 'message_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.String(20))
+    position = db.Column(db.Integer)
+    message_id = db.Column(db.String(30))
+    url = db.Column(db.String(500))
+
+    def __init__(self, group_id, position, message_id, url):
+        self.group_id = group_id
+        self.position = position
+        self.message_id = message_id
+        self.url = url
+
+    @classmethod
+    def get_newest(cls, group_id):
+        """
+        Retrieve the most recently indexed gallery image of a group
+
+        :param group_id: Group ID of the gallery
+        :return: GalleryImage object or None
+        """
+        return cls.query.filter_by(group_id=group_id) \
+            .order_by(cls.position.desc()).first()
+
+    @classmethod
+    def get_at(cls, group_id, position):
+        """
+        Retrieve the gallery image at a position in a group's index
+
+        :param group_id: Group ID of the gallery
+        :param position: Position of the image, from 0 to the image count - 1
+        :return: GalleryImage object or None
+        """
+        return cls.query.filter_by(group_id=group_id, position=position).first()
+
+    @classmethod
+    def is_indexed(cls, group_id, message_id):
+        """
+        Checks whether a message's images are in a group's gallery index
+
+        :param group_id: Group ID of the gallery
+        :param message_id: ID of the message
+        :return: bool
+        """
+        return db.session.query(cls.query.filter_by(group_id=group_id,
+                                                    message_id=message_id).exists()).scalar()
+
+    @classmethod
+    def get_message_ids(cls, group_id):
+        """
+        Retrieve the IDs of the messages whose images are in a group's
+        gallery index
+
+        :param group_id: Group ID of the gallery
+        :return: Set of message IDs
+        """
+        return {row.message_id for row in
+                db.session.query(cls.message_id).filter_by(group_id=group_id)}
+
+    @classmethod
+    def remove_messages(cls, group_id, message_ids):
+        """
+        Removes the images of messages from a group's gallery index and
+        moves the remaining images down so positions stay contiguous
+
+        :param group_id: Group ID of the gallery
+        :param message_ids: IDs of the messages to remove
+        :return: Number of images removed
+        """
+        if not message_ids:
+            return 0
+        removed = cls.query.filter(cls.group_id == group_id,
+                                   cls.message_id.in_(list(message_ids))) \
+            .delete(synchronize_session='fetch')
+
+        # Renumbered in ascending order, so each image moves into a position
+        # that has already been vacated
+        rows = db.session.query(cls.id, cls.position).filter_by(group_id=group_id) \
+            .order_by(cls.position).all()
+        db.session.bulk_update_mappings(cls, [
+            {'id': image_id, 'position': position}
+            for position, (image_id, old_position) in enumerate(rows) if position != old_position
+        ])
+        return removed
+
+
+class StatBucket(db.Model):
+    __tablename__ = 'stat_buckets'
+    __table_args__ = (
+        db.Index('uq_stat_buckets_group_bucket', 'group_id', 'resolution',
+                 'bucket_start', 'user_id', unique=True),
+        db.Index('ix_stat_buckets_group_start', 'group_id', 'bucket_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.String(20))
+    user_id = db.Column(db.String(20))
+    resolution = db.Column(db.Integer)
+    bucket_start = db.Column(db.DateTime)
+    messages = db.Column(db.Integer)
+    likes_received = db.Column(db.Integer)
+    likes_given = db.Column(db.Integer)
+
+    def __init__(self, group_id, user_id, resolution, bucket_start):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.resolution = resolution
+        self.bucket_start = bucket_start
+        self.messages = 0
+        self.likes_received = 0
+        self.likes_given = 0
+
+    @classmethod
+    def add_counts(cls, group_id, resolution, counts):
+        """
+        Adds counts onto a group's buckets, creating buckets that don't
+        exist yet. Does not commit.
+
+        :param group_id: Group ID of the buckets
+        :param resolution: Bucket size in seconds
+        :param counts: dict of (bucket start, user id) -> count dict, see stats.bucket_counts
+        """
+        if not counts:
+            return
+
+        starts = {bucket_start for bucket_start, _ in counts}
+        existing = cls.query.filter(cls.group_id == group_id,
+                                    cls.resolution == resolution,
+                                    cls.bucket_start.in_(starts)).all()
+        buckets = {(row.bucket_start, row.user_id): row for row in existing}
+
+        for (bucket_start, user_id), count in counts.items():
+            bucket = buckets.get((bucket_start, user_id))
+            if bucket is None:
+                bucket = cls(group_id, user_id, resolution, bucket_start)
+                db.session.add(bucket)
+            bucket.messages += count['messages']
+            bucket.likes_received += count['likes_received']
+            bucket.likes_given += count['likes_given']
+
+    @classmethod
+    def pop_older(cls, group_id, resolution, cutoff):
+        """
+        Removes and returns a group's buckets of one resolution that start
+        before `cutoff`. Does not commit.
+
+        :param group_id: Group ID of the buckets
+        :param resolution: Bucket size in seconds
+        :param cutoff: datetime buckets have to start before
+        :return: List of StatBucket objects
+        """
+        query = cls.query.filter(cls.group_id == group_id,
+                                 cls.resolution == resolution,
+                                 cls.bucket_start < cutoff)
+        rows = query.all()
+        if rows:
+            query.delete(synchronize_session='evaluate')
+        return rows
+
+    @classmethod
+    def sum_counts(cls, group_id, since):
+        """
+        Sums every member's buckets starting at or after `since`
+
+        :param group_id: Group ID of the buckets
+        :param since: datetime of the start of the window
+        :return: dict of user id -> count dict
+        """
+        rows = db.session.query(cls.user_id,
+                                db.func.sum(cls.messages),
+                                db.func.sum(cls.likes_received),
+                                db.func.sum(cls.likes_given)) \
+            .filter(cls.group_id == group_id, cls.bucket_start >= since) \
+            .group_by(cls.user_id).all()
+
+        return {user_id: {'messages': int(messages or 0),
+                          'likes_received': int(likes_received or 0),
+                          'likes_given': int(likes_given or 0)}
+                for user_id, messages, likes_received, likes_given in rows}
+
+
+class StatsSnapshot(db.Model):
+    __tablename__ = 'stats_snapshots'
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.String(20), unique=True)
+    version = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime)
+    view = db.Column(db.PickleType)
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.version = 0
+
+    @classmethod
+    def get_snapshot(cls, group_id):
+        """
+        Retrieve the precomputed /stats view model of a group
+
+        :param group_id: Group ID of the group
+        :return: StatsSnapshot object or None
+        """
+        return cls.query.filter_by(group_id=group_id).first()
+
+    @classmethod
+    def publish(cls, group_id, view):
+        """
+        Stores a new version of a group's view model. Does not commit.
+
+        :param group_id: Group ID of the group
+        :param view: dict of template variables
+        :return: StatsSnapshot object
+        """
+        snapshot = cls.get_snapshot(group_id)
+        if snapshot is None:
+            snapshot = cls(group_id)
+            db.session.add(snapshot)
+        snapshot.version += 1
+        snapshot.updated_at = datetime.utcnow().replace(microsecond=0)
+        snapshot.view = view
+        return snapshot
+
+
+class Backfill(db.Model):
+    __tablename__ = 'backfills'
+    FETCHING = 'fetching'
+    TALLYING = 'tallying'
+
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.String(20), unique=True)
+    phase = db.Column(db.String(20))
+    last_created_at = db.Column(db.DateTime)
+    last_message_id = db.Column(db.String(30))
+    message_count = db.Column(db.Integer)
+    like_count = db.Column(db.Integer)
+    ml_likes = db.Column(db.Integer)
+    ml_message = db.Column(db.String(1000))
+    counts = db.Column(db.PickleType)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.phase = self.FETCHING
+        self.message_count = 0
+        self.like_count = 0
+        self.ml_likes = 0
+        self.ml_message = 'None'
+        self.counts = {}
+        self.started_at = datetime.utcnow().replace(microsecond=0)
+        self.updated_at = self.started_at
+
+    @classmethod
+    def get_backfill(cls, group_id):
+        """
+        Retrieve the checkpoint of a group's unfinished backfill
+
+        :param group_id: Group ID of the group
+        :return: Backfill object or None
+        """
+        return cls.query.filter_by(group_id=group_id).first()
+
+    @property
+    def position(self):
+        if self.last_message_id is None:
+            return None
+        return self.last_created_at, self.last_message_id
+
+    def add_page(self, messages, counts, like_count, most_liked):
+        """
+        Folds a tallied page of messages into the partial aggregates and
+        moves the checkpoint past it. Does not commit.
+
+        :param messages: The page of Message objects, oldest first
+        :param counts: Counts of the page keyed by user id, see stats.tally
+        :param like_count: Likes received in the page
+        :param most_liked: Most liked message of the page or None
+        """
+        merged = {user_id: dict(count) for user_id, count in self.counts.items()}
+        for user_id, count in counts.items():
+            total = merged.setdefault(user_id, {'message_count': 0, 'like_count': 0,
+                                                'likes_given': 0})
+            for field in total:
+                total[field] += count[field]
+
+        # Reassigned rather than mutated so the change is persisted
+        self.counts = merged
+        self.message_count += sum(count['message_count'] for count in counts.values())
+        self.like_count += like_count
+        if most_liked is not None:
+            self.ml_likes = len(most_liked.favorited_by)
+            self.ml_message = f'{most_liked.name}: {most_liked.text}'
+        self.last_created_at = messages[-1].created_at
+        self.last_message_id = messages[-1].id
+        self.updated_at = datetime.utcnow().replace(microsecond=0)
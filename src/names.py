@@ -0,0 +1,16 @@
+def normalize(name):
+    """
+    Reduces a nickname to the key it is looked up by: case folded, with
+    runs of whitespace collapsed and any leading @ from a mention dropped
+
+    :param name: Nickname, or text naming a member such as "@Nick"
+    :return: str
+    """
+    return ' '.join(name.lstrip('@').split()).casefold()
+
+
+def escape_like(text):
+    """
+    Escapes text for use as a literal in a LIKE pattern with escape='\\'
+    """
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from src import app, metrics, queues
+
+POST_URL = app.config['GROUPME_API_URL'] + 'bots/post'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+session = requests.Session()
+# Only connection failures are retried here: the message can't have been
+# posted yet. Reads are never retried so a slow response can't double post.
+session.mount('https://', HTTPAdapter(
+    pool_connections=4, pool_maxsize=16,
+    max_retries=Retry(total=None, connect=app.config['BOT_POST_RETRIES'], read=0,
+                      redirect=0, backoff_factor=0.5)))
+session.hooks['response'].append(metrics.record_api_response)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. `rate` tokens are added per second up to
+    `capacity`; acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+# Chunks of one message must not interleave with another send from the
+# same bot, so deliveries are serialized per bot.
+_delivery_locks = {}
+
+
+def get_limiter(bot_id):
+    with _limiters_lock:
+        if bot_id not in _limiters:
+            _limiters[bot_id] = TokenBucket(app.config['BOT_POST_RATE'],
+                                            app.config['BOT_POST_BURST'])
+            _delivery_locks[bot_id] = threading.Lock()
+        return _limiters[bot_id]
+
+
+def post(bot_id, text, attachments=None):
+    """
+    Posts a single message as a bot, waiting for the bot's rate limiter and
+    retrying with exponential backoff on 429 and 5xx responses. Failed
+    connections are retried by the session's adapter; other errors, such
+    as read timeouts, are not, since GroupMe may already have posted the
+    message.
+
+    :param bot_id: ID of the bot posting the message
+    :param text: Text of the message
+    :param attachments: List of attachment dicts, defaults to None
+    :return: requests Response object
+    """
+    payload = {'bot_id': bot_id, 'text': text, 'attachments': attachments or []}
+    limiter = get_limiter(bot_id)
+    retries = app.config['BOT_POST_RETRIES']
+
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        response = session.post(POST_URL, json=payload, timeout=10)
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            response.raise_for_status()
+            return response
+
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            time.sleep(int(retry_after))
+            continue
+
+        time.sleep(2 ** attempt * 0.5 + random.uniform(0, 0.25))
+
+
+def deliver(bot_id, chunks, attachments=None):
+    """
+    Posts message chunks in order. Attachments are sent with every chunk,
+    like the chunked send always has.
+
+    :param bot_id: ID of the bot posting the messages
+    :param chunks: List of message texts
+    :param attachments: List of attachment dicts, defaults to None
+    """
+    get_limiter(bot_id)
+    with _delivery_locks[bot_id]:
+        for chunk in chunks:
+            post(bot_id, chunk, attachments)
+
+
+def enqueue(bot_id, chunks, attachments=None):
+    """
+    Delivers message chunks from the RQ worker instead of the calling
+    thread
+
+    :param bot_id: ID of the bot posting the messages
+    :param chunks: List of message texts
+    :param attachments: List of attachment dicts, defaults to None
+    :return: RQ Job object
+    """
+    return queues['high'].enqueue(deliver, bot_id, chunks, attachments)
+
+
+def serialize_attachments(attachments):
+    if not attachments:
+        return None
+    return [attachment.to_json() for attachment in attachments]
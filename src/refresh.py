@@ -0,0 +1,174 @@
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from src import app, db, groupme, groupy_client, ingest, utils
+from src import stats as group_stats
+from src.models import Backfill, Group, Member, Message
+from src.worker import conn
+
+BUDGET_KEY = 'gmbot:fleet:budget'
+
+
+def stats_lock(group_id):
+    """
+    Redis lock held while a group's counters are being updated, so !stats
+    and the fleet refresh never count the same new messages twice
+
+    :param group_id: Group ID of the group
+    :return: redis Lock object
+    """
+    return conn.lock(f'gmbot:stats:{group_id}', timeout=app.config['COMMAND_JOB_TIMEOUT'])
+
+
+def refresh_stats(bot):
+    """
+    Brings a group's stored messages, member counters and /stats view model
+    up to date. Hold stats_lock while calling this.
+
+    :param bot: The bot within the group to refresh
+    :return: Number of new messages counted
+    """
+    Member.save_new_members(bot)
+    db_group = Group.get_group(bot.group_id)
+
+    ingest.ingest_messages(bot, since=db_group.last_updated)
+    new_messages = Message.stream_messages(bot.group_id, after=db_group.last_updated)
+
+    started = time.time()
+    members = {member.user_id: member for member in Member.get_members(bot.group_id)}
+    counts, total_likes, most_liked = group_stats.tally(new_messages, members,
+                                                        db_group.ml_likes)
+    if most_liked is not None:
+        db_group.ml_likes = len(most_liked.favorited_by)
+        db_group.ml_message = f'{most_liked.name}: {most_liked.text}'
+
+    rows = Member.add_counts(members, counts)
+    message_count = sum(count['message_count'] for count in counts.values())
+    if message_count:
+        latest = Message.get_latest(bot.group_id)
+        db_group.update(bot.group, total_likes, latest.created_at)
+    db.session.commit()
+
+    # Published after the bulk update is committed so the view model is
+    # built from the fresh member rows
+    group_stats.publish_view_model(bot.group_id)
+    db.session.commit()
+    # /info shows the message count and most liked message
+    utils.invalidate_info(bot.group_id)
+    app.logger.info(f'Stats for {bot.group_id}: {message_count} messages, '
+                    f'{rows} members updated in {time.time() - started:.2f}s')
+    return message_count
+
+
+class ApiBudget:
+    """
+    Fixed-window rate limiter shared through Redis: at most `rate` calls
+    per second across every process drawing from the same budget.
+    acquire() blocks until the call fits in the budget.
+    """
+
+    def __init__(self, rate, key=BUDGET_KEY):
+        self.rate = rate
+        self.key = key
+
+    def acquire(self):
+        while True:
+            window = int(time.time())
+            pipe = conn.pipeline()
+            pipe.incr(f'{self.key}:{window}')
+            pipe.expire(f'{self.key}:{window}', 2)
+            used, _ = pipe.execute()
+            if used <= self.rate:
+                return
+            time.sleep(max(window + 1 - time.time(), 0))
+
+
+# API calls per group id during a fleet refresh. Counted from the URL since
+# message pages are prefetched on other threads.
+_calls = Counter()
+_calls_lock = threading.Lock()
+GROUP_URL = re.compile(r'/groups/(\d+)')
+
+
+def _budgeted(request, budget):
+    def wrapper(method, url, *args, **kwargs):
+        budget.acquire()
+        match = GROUP_URL.search(url)
+        if match:
+            with _calls_lock:
+                _calls[match.group(1)] += 1
+        return request(method, url, *args, **kwargs)
+    return wrapper
+
+
+def refresh_all(workers=None, rate=None):
+    """
+    Refreshes the stats of every initialized group that has a loaded bot,
+    `workers` groups at a time. Every GroupMe API call made by this process
+    draws from a shared budget of `rate` calls per second, leaving the rest
+    of the API rate limit to interactive commands. Groups already being
+    refreshed by !stats or recounted by !slow_stats are skipped.
+
+    :param workers: Number of groups refreshed at once, defaults to FLEET_REFRESH_WORKERS
+    :param rate: API calls per second, defaults to FLEET_API_BUDGET
+    :return: List of (group id, status, messages counted, API calls, seconds) tuples
+    """
+    workers = workers or app.config['FLEET_REFRESH_WORKERS']
+    budget = ApiBudget(rate or app.config['FLEET_API_BUDGET'])
+    group_ids = [group.group_id for group in Group.get_groups()]
+    db.session.remove()
+
+    started = time.time()
+    session = groupy_client.session
+    session.request = _budgeted(session.request, budget)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_refresh_group, group_ids))
+    finally:
+        del session.request
+
+    refreshed = [result for result in results if result[1] == 'ok']
+    app.logger.info(f'Fleet refresh: {len(refreshed)}/{len(results)} groups, '
+                    f'{sum(result[2] for result in refreshed)} messages, '
+                    f'{sum(result[3] for result in results)} API calls '
+                    f'in {time.time() - started:.2f}s')
+    return results
+
+
+def _refresh_group(group_id):
+    bot = groupme.get_bot(group_id)
+    if bot is None:
+        app.logger.info(f'Fleet refresh {group_id}: skipped, no bot loaded')
+        return group_id, 'no bot', 0, 0, 0.0
+
+    lock = stats_lock(group_id)
+    if not lock.acquire(blocking=False):
+        app.logger.info(f'Fleet refresh {group_id}: skipped, already refreshing')
+        return group_id, 'busy', 0, 0, 0.0
+
+    started = time.time()
+    status, messages = 'ok', 0
+    try:
+        # The backfill replaces every counter when it finishes, so counts
+        # added in the meantime would be dropped
+        if Backfill.get_backfill(group_id) is not None:
+            status = 'backfill'
+        else:
+            messages = refresh_stats(bot)
+    except Exception:
+        app.logger.exception(f'Fleet refresh {group_id}: failed')
+        db.session.rollback()
+        status = 'error'
+    finally:
+        lock.release()
+        db.session.remove()
+
+    elapsed = time.time() - started
+    with _calls_lock:
+        calls = _calls.pop(group_id, 0)
+    app.logger.info(f'Fleet refresh {group_id}: {status}, {messages} messages, '
+                    f'{calls} API calls in {elapsed:.2f}s')
+    return group_id, status, messages, calls, elapsed
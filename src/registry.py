@@ -0,0 +1,64 @@
+import threading
+
+
+class BotRegistry:
+    """
+    Holds the active GroupMeBot objects indexed by both group id and bot id
+    so callbacks can find their bot without scanning every loaded bot.
+    """
+
+    def __init__(self):
+        self._by_group = {}
+        self._by_bot = {}
+        self._lock = threading.Lock()
+
+    def add(self, bot):
+        """
+        Register a GroupMeBot, replacing any bot already registered for
+        the same group
+
+        :param bot: GroupMeBot object to register
+        """
+        with self._lock:
+            previous = self._by_group.get(bot.group_id)
+            if previous is not None:
+                self._by_bot.pop(previous.bot_id, None)
+            self._by_group[bot.group_id] = bot
+            self._by_bot[bot.bot_id] = bot
+
+    def remove(self, bot):
+        with self._lock:
+            self._by_group.pop(bot.group_id, None)
+            self._by_bot.pop(bot.bot_id, None)
+
+    def get(self, group_id):
+        """
+        Retrieve the GroupMeBot living in a group
+
+        :param group_id: group id of the GroupMeBot object
+        :return: GroupMeBot object or None
+        """
+        return self._by_group.get(group_id)
+
+    def get_by_bot_id(self, bot_id):
+        """
+        Retrieve a GroupMeBot by its GroupMe bot id
+
+        :param bot_id: bot id of the GroupMeBot object
+        :return: GroupMeBot object or None
+        """
+        return self._by_bot.get(bot_id)
+
+    def clear(self):
+        with self._lock:
+            self._by_group.clear()
+            self._by_bot.clear()
+
+    def __iter__(self):
+        return iter(list(self._by_group.values()))
+
+    def __len__(self):
+        return len(self._by_group)
+
+    def __contains__(self, group_id):
+        return group_id in self._by_group
@@ -0,0 +1,127 @@
+import heapq
+import time
+from datetime import datetime, timezone
+from itertools import groupby
+
+from groupy import attachments
+
+from src import app, db, groupme
+from src.models import Reminder
+from src.worker import conn
+
+CHANNEL = 'gmbot:reminders'
+MAX_SLEEP = 300
+RETRY_DELAY = 60
+
+
+def timestamp(remind_time):
+    """
+    Converts a naive UTC reminder time into a Unix timestamp
+    """
+    return remind_time.replace(tzinfo=timezone.utc).timestamp()
+
+
+def notify(reminder):
+    """
+    Tells the running scheduler about a newly created reminder so it can
+    wake up in time for it
+
+    :param reminder: Reminder object that was just committed
+    """
+    conn.publish(CHANNEL, f'{reminder.id}:{timestamp(reminder.remind_time)}')
+
+
+class ReminderScheduler:
+    """
+    Keeps a min-heap of upcoming reminder times and sleeps until the next
+    one is due (or until a new reminder is published), then delivers every
+    due reminder in one batch.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.pubsub = conn.pubsub(ignore_subscribe_messages=True)
+
+    def load(self):
+        self.heap = [(timestamp(r_time), r_id)
+                     for r_time, r_id in Reminder.get_upcoming(datetime.utcnow())]
+        heapq.heapify(self.heap)
+
+    def run(self):
+        self.pubsub.subscribe(CHANNEL)
+        self.load()
+        self.deliver_due()
+
+        while True:
+            timeout = MAX_SLEEP
+            if self.heap:
+                timeout = min(max(self.heap[0][0] - time.time(), 0), MAX_SLEEP)
+
+            message = self.pubsub.get_message(timeout=timeout)
+            if message is not None:
+                r_id, r_time = message['data'].decode().split(':')
+                heapq.heappush(self.heap, (float(r_time), int(r_id)))
+
+            if self.heap and self.heap[0][0] <= time.time():
+                self.deliver_due()
+            elif message is None and not self.heap:
+                # Periodically re-sync in case a notification was missed
+                self.load()
+
+    def deliver_due(self):
+        """
+        Sends every due reminder, grouped by group. Each reminder is deleted
+        as soon as it is sent; reminders that could not be sent are kept
+        and retried after RETRY_DELAY seconds.
+        """
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            heapq.heappop(self.heap)
+
+        reminders = Reminder.get_due(datetime.utcnow())
+        if not reminders:
+            return
+
+        delivered, kept = 0, []
+        by_group = lambda reminder: reminder.group_id
+        for group_id, group_reminders in groupby(sorted(reminders, key=by_group), key=by_group):
+            group_reminders = list(group_reminders)
+            bot = groupme.get_bot(group_id)
+            if bot is None:
+                app.logger.info(f'No bot loaded for group {group_id}, keeping '
+                                f'{len(group_reminders)} reminders')
+                kept.extend(group_reminders)
+                continue
+
+            for reminder in group_reminders:
+                try:
+                    member = groupme.get_member(group_id, user_id=reminder.user_id)
+                    # Reminders for members who left the group are dropped
+                    if member is not None:
+                        send_reminder(member, reminder.message, bot)
+                        delivered += 1
+                except Exception:
+                    app.logger.exception(f'Could not send reminder {reminder.id}')
+                    kept.append(reminder)
+                    continue
+
+                db.session.delete(reminder)
+                db.session.commit()
+
+        for reminder in kept:
+            heapq.heappush(self.heap, (now + RETRY_DELAY, reminder.id))
+        app.logger.info(f'{delivered} reminders delivered, {len(kept)} kept for retry')
+
+
+def send_reminder(member, message, bot):
+    loci = [10, len(member.nickname) + 1]
+    mention = attachments.Mentions(loci=[loci], user_ids=[member.user_id])
+    bot.send(f'Reminding @{member.nickname}:\n{message}', attachments=[mention])
+
+
+if __name__ == '__main__':
+    from src.loader import load_bots
+
+    with app.app_context():
+        load_bots()
+        ReminderScheduler().run()
@@ -0,0 +1,206 @@
+from datetime import datetime, timedelta
+
+from src import utils
+from src.models import Group, Member, StatBucket, StatsSnapshot
+
+EPOCH = datetime(1970, 1, 1)
+
+# Bucket resolutions in seconds, each with how long buckets are kept at
+# that resolution before being compacted into the next one
+BUCKET_LEVELS = [
+    (5 * 60, timedelta(days=2)),
+    (60 * 60, timedelta(days=60)),
+    (24 * 60 * 60, None),
+]
+
+GRAPH_COLORS = [
+    '#F7464A', '#46BFBD', '#FDB45C', '#FEDCBA', '#ABCDEF',
+    '#DDDDDD', '#ABCABC', '#2C79E0', '#4DE02C', '#C21010',
+    '#8110C2', '#10C2AA', '#C21026', '#FBFF0F', '#FF0FE6',
+    '#990FFF', '#9AF0FF', '#FFEB9A', '#FF9AC0', '#FF9A9A',
+    '#8FF032', '#4AFEDC', '#341943', '#BDBD99', '#994529',
+    '#CDB23D', '#23F3A0', '#342343', '#343453', '#475453',
+]
+
+
+def tally(messages, user_ids, ml_likes=0):
+    """
+    Counts messages sent, likes received and likes given per member in a
+    single pass over `messages`. Messages from senders that aren't in
+    `user_ids` (bots, former members) are skipped.
+
+    :param messages: Iterable of Groupy or stored Message objects
+    :param user_ids: User IDs of the members to count for
+    :param ml_likes: Like count the most liked message has to match, defaults to 0
+    :return: Tuple of (counts keyed by user id, total likes, most liked message or None)
+    """
+    counts = {}
+    total_likes = 0
+    most_liked = None
+
+    for message in messages:
+        if message.user_id not in user_ids:
+            continue
+
+        likes = len(message.favorited_by)
+        sender = counts.setdefault(message.user_id, _empty_counts())
+        sender['message_count'] += 1
+        sender['like_count'] += likes
+        total_likes += likes
+
+        for user_id in message.favorited_by:
+            if user_id in user_ids:
+                counts.setdefault(user_id, _empty_counts())['likes_given'] += 1
+
+        if likes >= ml_likes:
+            ml_likes = likes
+            most_liked = message
+
+    return counts, total_likes, most_liked
+
+
+def _empty_counts():
+    return {'message_count': 0, 'like_count': 0, 'likes_given': 0}
+
+
+def floor_time(dt, resolution):
+    """
+    Rounds a datetime down to the start of its bucket
+
+    :param dt: datetime to round
+    :param resolution: Bucket size in seconds
+    :return: datetime of the bucket start
+    """
+    dt = dt.replace(microsecond=0)
+    return dt - timedelta(seconds=(dt - EPOCH).total_seconds() % resolution)
+
+
+def bucket_counts(messages, resolution=BUCKET_LEVELS[0][0]):
+    """
+    Counts messages sent, likes received and likes given per member and
+    per time bucket. Likes are counted in the bucket of the liked message.
+
+    :param messages: Iterable of Groupy or stored Message objects
+    :param resolution: Bucket size in seconds, defaults to 5 minutes
+    :return: dict of (bucket start, user id) -> count dict
+    """
+    counts = {}
+    for message in messages:
+        bucket = floor_time(message.created_at, resolution)
+        sender = counts.setdefault((bucket, message.user_id), empty_bucket())
+        sender['messages'] += 1
+        sender['likes_received'] += len(message.favorited_by)
+
+        for user_id in message.favorited_by:
+            counts.setdefault((bucket, user_id), empty_bucket())['likes_given'] += 1
+    return counts
+
+
+def compact_buckets(group_id, now=None):
+    """
+    Merges buckets older than their level's retention into buckets of the
+    next coarser resolution, keeping the number of stored buckets bounded
+
+    :param group_id: Group ID of the buckets
+    :param now: Current time as naive UTC, defaults to datetime.utcnow()
+    """
+    now = now or datetime.utcnow()
+    for (resolution, retain), (coarser, _) in zip(BUCKET_LEVELS, BUCKET_LEVELS[1:]):
+        cutoff = floor_time(now - retain, coarser)
+        rows = StatBucket.pop_older(group_id, resolution, cutoff)
+        if not rows:
+            continue
+
+        counts = {}
+        for row in rows:
+            key = (floor_time(row.bucket_start, coarser), row.user_id)
+            merged = counts.setdefault(key, empty_bucket())
+            for field in merged:
+                merged[field] += getattr(row, field)
+        StatBucket.add_counts(group_id, coarser, counts)
+
+
+def bucket_resolution(created_at, now):
+    """
+    Finds the resolution of the stored bucket counting a message once
+    compact_buckets has run at `now`
+
+    :param created_at: Creation time of the message
+    :param now: Time compact_buckets ran at
+    :return: Bucket size in seconds
+    """
+    for (resolution, retain), (coarser, _) in zip(BUCKET_LEVELS, BUCKET_LEVELS[1:]):
+        if floor_time(created_at, resolution) >= floor_time(now - retain, coarser):
+            return resolution
+    return BUCKET_LEVELS[-1][0]
+
+
+def empty_bucket():
+    return {'messages': 0, 'likes_received': 0, 'likes_given': 0}
+
+
+def build_view_model(group, members):
+    """
+    Computes everything the /stats page renders for a group
+
+    :param group: Group database entry
+    :param members: List of the group's Member database entries
+    :return: dict of template variables for stats.html
+    """
+    # chart labels/values
+    labels = [member.username for member in members]
+    likes_recv_values = [member.like_count for member in members]
+    likes_given_values = [member.likes_given for member in members]
+    msg_values = [member.message_count for member in members]
+    colors = GRAPH_COLORS[:len(members)]
+
+    # ratio stuff
+    ratio_info = {
+        'likes_recv': {},
+        'likes_given': {},
+        'messages': {},
+        'ratio': {}
+    }
+    for member in members:
+        ratio_info['likes_recv'][member.username] = member.like_count
+        ratio_info['likes_given'][member.username] = member.likes_given
+        ratio_info['messages'][member.username] = member.message_count
+        try:
+            ratio = round(member.like_count / member.message_count, 2)
+            ratio_info['ratio'][member.username] = ratio
+        except ZeroDivisionError:
+            ratio_info['ratio'][member.username] = 0.00
+
+    ratio_values = [ratio_info['ratio'][label] for label in labels]
+    pics = [member.avatar_url for member in members]
+
+    return {
+        'group': {
+            'group_name': group.group_name,
+            'message_count': group.message_count,
+            'last_updated': group.last_updated,
+        },
+        'likes_set': list(zip(labels, likes_recv_values)),
+        'given_set': list(zip(labels, likes_given_values)),
+        'messages_set': list(zip(labels, msg_values)),
+        'ratios_set': list(zip(labels, ratio_values, colors, pics)),
+        'likes': utils.order_dict(ratio_info['likes_recv']),
+        'messages': utils.order_dict(ratio_info['messages']),
+        'given': utils.order_dict(ratio_info['likes_given']),
+        'ratios': utils.order_dict(ratio_info['ratio']),
+    }
+
+
+def publish_view_model(group_id):
+    """
+    Rebuilds a group's /stats view model and stores it as a new snapshot
+    version. Does not commit.
+
+    :param group_id: Group ID of the group
+    :return: StatsSnapshot object or None if the group isn't initialized
+    """
+    group = Group.get_group(group_id)
+    if group is None:
+        return None
+    view = build_view_model(group, Member.get_members(group_id))
+    return StatsSnapshot.publish(group_id, view)
@@ -1,8 +1,20 @@
 import re
+from datetime import timedelta
 
-from src import db
+from src import app, db
 from src.bot.groupmebot import GroupMeBot
+from src.cache import VersionedCache
 from src.models import Command
+from src.worker import conn
+
+USAGE_KEY = 'gmbot:command_usage'
+
+command_tables = VersionedCache(conn, 'gmbot:commands:version',
+                                maxsize=app.config['GROUP_CACHE_SIZE'],
+                                ttl=app.config['COMMAND_CACHE_TTL'])
+info_pages = VersionedCache(conn, 'gmbot:info:version',
+                            maxsize=app.config['GROUP_CACHE_SIZE'],
+                            ttl=app.config['INFO_CACHE_TTL'])
 
 
 def read_file(text_file):
@@ -24,6 +36,52 @@ def validate_command(text):
     return False, None
 
 
+BOT_MESSAGE = 'bot'
+CHAT_MESSAGE = 'chat'
+COMMAND_MESSAGE = 'command'
+
+
+def classify_message(data):
+    """
+    Cheaply classifies a raw callback payload before any database or API
+    work is done.
+
+    :param data: JSON payload of the GroupMe callback
+    :return: Tuple of (message kind, command name or None)
+    """
+    if data.get('sender_type') != 'user':
+        return BOT_MESSAGE, None
+
+    valid_command, command_name = validate_command(data['text'].lower())
+    if valid_command:
+        return COMMAND_MESSAGE, command_name
+    return CHAT_MESSAGE, None
+
+
+def get_command_table(group_id):
+    """
+    Loads the user-added commands of a group into a dict keyed by lowercased
+    command name. Tables are cached until a command is added, edited or
+    deleted in any process.
+
+    :param group_id: ID of group to fetch commands from
+    :return: dict of command name -> {'id', 'response'}
+    """
+    def load():
+        return {cmd.command.lower(): {'id': cmd.id, 'response': cmd.response}
+                for cmd in Command.get_commands(group_id)}
+    return command_tables.get_or_set(group_id, load)
+
+
+def invalidate_commands(group_id):
+    command_tables.invalidate(group_id)
+    info_pages.invalidate(group_id)
+
+
+def invalidate_info(group_id):
+    info_pages.invalidate(group_id)
+
+
 def get_all_commands(group_id):
     """
     Loads all command names. Includes built in commands and db commands
@@ -32,21 +90,89 @@ def get_all_commands(group_id):
     :return: list of command names
     """
     command_list = [v.name for _, v in GroupMeBot.commands.items() if not v.hidden]
-    for cmd in Command.get_commands(group_id):
-        command_list.append(cmd.command.lower())
+    command_list.extend(get_command_table(group_id))
     return command_list
 
 
 def search(message, bot):
-    if message in get_all_commands(bot.group_id):
-        cmd = Command.get_command(bot.group_id, message)
-        bot.send(cmd.response)
-        cmd.times_used += 1
-        db.session.commit()
+    cmd = get_command_table(bot.group_id).get(message)
+    if cmd is not None:
+        bot.send(cmd['response'])
+        record_usage(cmd['id'])
     else:
         bot.send(f'Command !{message} does not exist')
 
 
+def record_usage(command_id):
+    """
+    Counts a times_used increment in Redis. The counts are written to the
+    database at most every COMMAND_USAGE_FLUSH_INTERVAL seconds, by the
+    first process to record a use once the interval has passed.
+
+    :param command_id: Database ID of the used command
+    """
+    conn.hincrby(USAGE_KEY, command_id, 1)
+    if conn.set(USAGE_KEY + ':flushed', 1, nx=True,
+                ex=app.config['COMMAND_USAGE_FLUSH_INTERVAL']):
+        flush_usage()
+
+
+def flush_usage():
+    """
+    Moves all counted times_used increments from Redis into the database
+    in a single commit
+    """
+    pipe = conn.pipeline()
+    pipe.hgetall(USAGE_KEY)
+    pipe.delete(USAGE_KEY)
+    usage, _ = pipe.execute()
+    if not usage:
+        return
+
+    try:
+        for command_id, count in usage.items():
+            Command.query.filter_by(id=int(command_id)) \
+                .update({Command.times_used: Command.times_used + int(count)},
+                        synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        pipe = conn.pipeline()
+        for command_id, count in usage.items():
+            pipe.hincrby(USAGE_KEY, command_id, int(count))
+        pipe.execute()
+        raise
+
+
+WINDOW_UNITS = {
+    'm': ('minute', timedelta(minutes=1)),
+    'h': ('hour', timedelta(hours=1)),
+    'd': ('day', timedelta(days=1)),
+    'w': ('week', timedelta(weeks=1)),
+}
+MAX_WINDOW = timedelta(weeks=520)
+
+
+def parse_window(text):
+    """
+    Parses a time window such as 30m, 2h, 1d or 1w
+
+    :param text: Window to parse
+    :return: Tuple of (timedelta, readable label) or None if invalid or
+             longer than MAX_WINDOW
+    """
+    result = re.match(r'^(\d+)\s*([mhdw])', text.strip().lower())
+    if not result or int(result.group(1)) < 1:
+        return None
+
+    amount = int(result.group(1))
+    unit, delta = WINDOW_UNITS[result.group(2)]
+    if amount > MAX_WINDOW // delta:
+        return None
+    label = f'{amount} {unit}' if amount == 1 else f'{amount} {unit}s'
+    return delta * amount, label
+
+
 def order_dict(d):
     """
     Sorts a dictionary by its values in descending order. Returns
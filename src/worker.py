@@ -7,7 +7,19 @@ listen = ['high', 'default', 'low']
 redis_url = os.getenv('REDISTOGO_URL')
 conn = redis.from_url(redis_url)
 
+
+class Worker(rq.Worker):
+    def perform_job(self, *args, **kwargs):
+        # Jobs run in a forked work horse that exits without running atexit
+        # handlers, so buffered metrics are flushed after every job
+        try:
+            return super().perform_job(*args, **kwargs)
+        finally:
+            from src import metrics
+            metrics.flush()
+
+
 if __name__ == '__main__':
     with rq.Connection(conn):
-        worker = rq.Worker(map(rq.Queue, listen))
+        worker = Worker(map(rq.Queue, listen))
         worker.work()
@@ -0,0 +1,4 @@
+from src import app
+from src.loader import load_bots
+
+load_bots(background=True)